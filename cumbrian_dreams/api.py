@@ -1,14 +1,38 @@
 # apps/cumbrian_dreams/cumbrian_dreams/api.py
-import frappe
-from frappe.utils import get_datetime, getdate
+import json
+from datetime import datetime, timedelta
 from typing import Optional
-from datetime import datetime
-from urllib.parse import quote
 
-ALLOWED_ROLES_DELEGATED = {"System Manager", "Support", "Host"}
+import frappe
+import requests
+from frappe.utils import cint, get_datetime, getdate, now_datetime
+
+from cumbrian_dreams import auth, availability, freetobook
+from cumbrian_dreams.cumbrian_dreams.doctype.booking.booking import is_active_slot_violation
+from cumbrian_dreams.cumbrian_dreams.doctype.external_availability.external_availability import (
+    find_properties,
+    find_property,
+    get_days_many,
+)
+from cumbrian_dreams.cumbrian_dreams.doctype.external_availability.external_availability import (
+    get_days as get_external_days,
+)
+from cumbrian_dreams.search import (
+    bump_availability_generation,
+    cached_listing,
+    listing_cache_stats,
+    parse_order,
+    property_facets,
+    search_bookings,
+    search_properties,
+    stay_range,
+)
+from cumbrian_dreams.search import (
+    suggest_locations as _suggest_locations,
+)
+from cumbrian_dreams.utils import encode_cursor, page_cursor, read_page_cursor, reserve_series
 
-def _exists_booking(property_name: str, dt):
-    return frappe.db.exists("Booking", {"property": property_name, "booking_date": dt})
+ALLOWED_ROLES_DELEGATED = {"System Manager", "Support", "Host"}
 
 @frappe.whitelist(allow_guest=True, methods=["GET"])
 def list_properties(
@@ -19,18 +43,26 @@ def list_properties(
     location: Optional[str] = None,   # partial match
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
-    order_by: Optional[str] = "modified desc"  # e.g. "price asc", "title desc"
+    order_by: Optional[str] = None,   # e.g. "price asc", "title desc"; default relevance with q, else modified desc
+    from_date: Optional[str] = None,  # check-in (YYYY-MM-DD)
+    to_date: Optional[str] = None,    # check-out, exclusive; defaults to one night
+    cursor: Optional[str] = None,     # next_cursor from the previous page (replaces offset)
+    facets: Optional[int] = 0,        # 1 -> add location / price / feature counts
 ):
     """Public listing of properties with paging & filters.
 
     Query params (all optional):
       - limit (1..100), offset (>=0)
-      - q           : free text search on title/location/features
+      - q           : free text search on title/location/features (word prefixes)
       - host        : exact host user (email/name)
       - location    : partial match
       - min_price   : >=
       - max_price   : <=
-      - order_by    : one of [price|title|location|modified|name] + [asc|desc]
+      - order_by    : one of [relevance|price|title|location|modified|name] + [asc|desc]
+      - from_date / to_date : only properties free for every night of the stay
+      - cursor      : next_cursor of the previous response; cheaper than offset on deep pages
+      - facets      : 1 to include counts per location, price bucket and feature tag
+                      for the current filters (ignores paging)
     """
     # sanitize paging
     try:
@@ -57,62 +89,58 @@ def list_properties(
         "modified"
     ]
 
-    # filters
-    filters = []
-    if host:
-        filters.append(["Property", "host", "=", host])
-    if location:
-        filters.append(["Property", "location", "like", f"%{location}%"])
-    if min_price is not None and str(min_price) != "":
+    def _price(v):
+        if v is None or str(v) == "":
+            return None
         try:
-            filters.append(["Property", "price_per_night", ">=", float(min_price)])
+            return float(v)
         except Exception:
-            pass
-    if max_price is not None and str(max_price) != "":
-        try:
-            filters.append(["Property", "price_per_night", "<=", float(max_price)])
-        except Exception:
-            pass
+            return None
+
+    order = parse_order(order_by, q)
+    key, direction = order
 
-    # OR search across a few text fields
-    or_filters = None
-    if q:
-        like = f"%{q}%"
-        or_filters = [
-            ["Property", "title", "like", like],
-            ["Property", "location", "like", like],
-            ["Property", "features", "like", like],
-        ]
-
-    # order by (whitelist)
-    safe_map = {
-        "price": "price_per_night",
-        "title": "title",
-        "location": "location",
-        "modified": "modified",
-        "name": "name",
+    after = None
+    if cursor:
+        pos = read_page_cursor(cursor, key, direction)
+        if "o" in pos:
+            offset = max(0, cint(pos["o"]))
+        else:
+            after, offset = (pos.get("v"), pos["n"]), 0
+
+    # normalized query: equal params -> same cached page (text matching is case-insensitive)
+    params = {
+        "host": host or None,
+        "location": (location or "").strip().lower() or None,
+        "min_price": _price(min_price),
+        "max_price": _price(max_price),
+        "q": (q or "").strip().lower() or None,
+        "stay": stay_range(from_date, to_date),
+        "order": order,
+        "limit": limit + 1,  # fetch one extra row to know if there's another page
+        "offset": offset,
+        "after": after,
     }
-    order_clause = "modified desc"
-    if isinstance(order_by, str):
-        parts = order_by.strip().split()
-        key = safe_map.get(parts[0].lower(), "modified") if parts else "modified"
-        direction = parts[1].lower() if len(parts) > 1 and parts[1].lower() in ("asc", "desc") else "desc"
-        order_clause = f"{key} {direction}"
-
-    # fetch one extra row to know if there's another page
-    rows = frappe.get_all(
-        "Property",
-        fields=fields,
-        filters=filters,
-        or_filters=or_filters,
-        limit_start=offset,
-        limit_page_length=limit + 1,
-        order_by=order_clause,
-    )
+    rows = cached_listing(params, lambda: search_properties(fields, **params))
+
+    facet_counts = None
+    if str(facets) in ("1", "true", "True"):
+        filters = {k: params[k] for k in ("host", "location", "min_price", "max_price", "q", "stay")}
+        facet_counts = cached_listing({**filters, "view": "facets"}, lambda: property_facets(**filters))
+
+    order_clause = " ".join(order)
 
     has_more = len(rows) > limit
     items = rows[:limit]
 
+    next_cursor = None
+    if has_more:
+        if key == "relevance":
+            # relevance scores aren't stable keys; carry the offset instead
+            next_cursor = encode_cursor({"k": key, "d": direction, "o": offset + limit})
+        else:
+            next_cursor = page_cursor(key, direction, items[-1])
+
     return {
         "ok": True,
         "items": items,
@@ -120,11 +148,20 @@ def list_properties(
             "offset": offset,
             "limit": limit,
             "has_more": has_more,
-            "next_offset": (offset + limit) if has_more else None,
+            "next_offset": (offset + limit) if has_more and not after else None,
             "order_by": order_clause,
         },
+        "next_cursor": next_cursor,
+        **({"facets": facet_counts} if facet_counts is not None else {}),
     }
 
+# GET /api/method/cumbrian_dreams.api.suggest_locations?q=kes&limit=8
+@frappe.whitelist(allow_guest=True, methods=["GET"])
+def suggest_locations(q: str | None = None, limit: int = 8):
+    """Typeahead for the location filter: locations with a word starting with q, by property count."""
+    limit = max(1, min(cint(limit) or 8, 20))
+    return {"ok": True, "items": _suggest_locations(q, limit)}
+
 # GET /api/method/cumbrian_dreams.api.get_property?name=PROP-0001
 @frappe.whitelist(allow_guest=True, methods=["GET"])
 def get_property(name: str = None):
@@ -167,6 +204,7 @@ from frappe.utils import get_datetime
 #   to_datetime     : 'YYYY-MM-DD HH:mm:ss'
 #   limit           : 1..100 (default 20)
 #   offset          : >=0   (default 0)
+#   cursor          : next_cursor from the previous page (keyset paging; offset is ignored)
 #   order_by        : [booking_date|modified|name] [asc|desc] (default: booking_date desc)
 #   include_property: 1/0 add property details (title, location, host, price_per_night)
 #   include_user    : 1/0 add user details (full_name, email)
@@ -185,6 +223,7 @@ def list_bookings(
     order_by: str = "booking_date desc",
     include_property: int = 0,
     include_user: int = 0,
+    cursor: str | None = None,
 ):
     from frappe.utils import get_datetime
 
@@ -202,106 +241,53 @@ def list_bookings(
     offset = max(0, offset)
 
     # ---- base filters ----
-    filters = []
-
     # Status logic (default Active; legacy include_cancelled=1 -> All)
     show_all_status = False
+    status_filter = "Active"
     if status:
         s = str(status).lower()
         if s in ("all", "any", "*"):
             show_all_status = True
         elif s in ("active", "cancelled"):
-            filters.append(["Booking", "status", "=", s.capitalize()])
-        else:
-            filters.append(["Booking", "status", "=", "Active"])
-    else:
-        if str(include_cancelled) in ("1", "true", "True"):
-            show_all_status = True
-        else:
-            filters.append(["Booking", "status", "=", "Active"])
-
-    if property:
-        filters.append(["Booking", "property", "=", property])
-
-    if from_datetime:
-        filters.append(["Booking", "booking_date", ">=", get_datetime(from_datetime)])
-    if to_datetime:
-        filters.append(["Booking", "booking_date", "<=", get_datetime(to_datetime)])
+            status_filter = s.capitalize()
+    elif str(include_cancelled) in ("1", "true", "True"):
+        show_all_status = True
+    if show_all_status:
+        status_filter = None
 
-    # ---- property allowlist from 'host' and/or 'q' ----
-    prop_name_allowlist = None
-
-    if host:
-        prop_name_allowlist = set(
-            frappe.get_all("Property", filters=[["Property", "host", "=", host]], pluck="name")
-        )
-
-    if q:
-        like = f"%{q}%"
-        matches = set(
-            frappe.get_all(
-                "Property",
-                or_filters=[
-                    ["Property", "title", "like", like],
-                    ["Property", "location", "like", like],
-                    ["Property", "features", "like", like],
-                ],
-                pluck="name",
-            )
-        )
-        prop_name_allowlist = matches if prop_name_allowlist is None else (prop_name_allowlist & matches)
-
-    if prop_name_allowlist is not None:
-        if not prop_name_allowlist:
-            return {
-                "ok": True,
-                "items": [],
-                "paging": {"offset": offset, "limit": limit, "has_more": False, "next_offset": None, "order_by": "booking_date desc"},
-                "filters_applied": {"property": property, "user": user, "host": host, "q": q, "status": "All" if show_all_status else (status or "Active")},
-            }
-        filters.append(["Booking", "property", "in", list(prop_name_allowlist)])
-
-    if user:
-        filters.append(["Booking", "user", "=", user])
+    def _empty():
+        return {
+            "ok": True,
+            "items": [],
+            "paging": {"offset": offset, "limit": limit, "has_more": False, "next_offset": None, "order_by": "booking_date desc"},
+            "next_cursor": None,
+            "filters_applied": {"property": property, "user": user, "host": host, "q": q, "status": "All" if show_all_status else (status or "Active")},
+        }
 
     # ---- permission model ----
+    # 'host' and 'q' are resolved by search_bookings as a join on Property;
+    # a permission restriction that contradicts an explicit filter means no rows.
     session_user = frappe.session.user
-    roles = set(frappe.get_roles(session_user))
+    roles = auth.roles()
+    user_filter, host_filter = user, host
 
     if "System Manager" not in roles:
         is_host = "Host" in roles
-        if is_host:
-            if property:
-                # If host asked for a specific property, allow full visibility only if they own it.
-                prop_host = frappe.db.get_value("Property", property, "host")
-                if prop_host != session_user:
-                    # Not their property -> restrict to their own bookings
-                    filters.append(["Booking", "user", "=", session_user])
-            else:
-                # No property specified -> limit to properties owned by the host
-                host_props = set(frappe.get_all("Property", filters={"host": session_user}, pluck="name"))
-                if prop_name_allowlist is None:
-                    prop_name_allowlist = host_props
-                else:
-                    prop_name_allowlist = prop_name_allowlist & host_props
-                if not prop_name_allowlist:
-                    return {
-                        "ok": True,
-                        "items": [],
-                        "paging": {"offset": offset, "limit": limit, "has_more": False, "next_offset": None, "order_by": "booking_date desc"},
-                        "filters_applied": {"property": property, "user": user, "host": host, "q": q, "status": "All" if show_all_status else (status or "Active")},
-                    }
-                # ensure an 'in' filter is applied for property
-                has_in_filter = any(isinstance(f, list) and len(f) >= 3 and f[1] == "property" and f[2] == "in" for f in filters)
-                if not has_in_filter:
-                    filters.append(["Booking", "property", "in", list(prop_name_allowlist)])
-        else:
-            # Normal user -> only their own bookings
-            filters.append(["Booking", "user", "=", session_user])
+        if is_host and not property:
+            # No property specified -> limit to properties owned by the host
+            if host_filter and host_filter != session_user:
+                return _empty()
+            host_filter = session_user
+        elif not (is_host and auth.owns_property(property)):
+            # Normal user, or a host asking about a property they do not own -> only their own bookings
+            if user_filter and user_filter != session_user:
+                return _empty()
+            user_filter = session_user
 
     # ---- order by (whitelist) ----
     safe_keys = {"booking_date": "booking_date", "modified": "modified", "name": "name"}
     ob = "booking_date desc"
+    key, dirn = "booking_date", "desc"
     if isinstance(order_by, str):
         parts = order_by.strip().split()
         key = safe_keys.get((parts[0].lower() if parts else ""), "booking_date")
@@ -309,19 +295,35 @@ def list_bookings(
         dirn = "asc" if dirn == "asc" else "desc"
         ob = f"{key} {dirn}"
 
+    # ---- keyset cursor: rows after (value, name) of the previous page's last row ----
+    after = None
+    if cursor:
+        pos = read_page_cursor(cursor, key, dirn)
+        if "v" not in pos or "n" not in pos:
+            # offset-shaped cursors belong to list_properties' relevance order
+            frappe.throw("Invalid cursor", exc=frappe.ValidationError)
+        offset = 0
+        after = (pos["v"], pos["n"])
+
     # ---- query ----
-    base_fields = ["name", "property", "user", "booking_date", "payment_completed", "status", "modified"]
-    rows = frappe.get_all(
-        "Booking",
-        fields=base_fields,
-        filters=filters,
-        order_by=ob,
-        limit_start=offset,
-        limit_page_length=limit + 1,  # one extra to compute has_more
+    rows = search_bookings(
+        ["name", "property", "user", "booking_date", "payment_completed", "status", "modified"],
+        status=status_filter,
+        property=property,
+        user=user_filter,
+        host=host_filter,
+        q=q,
+        from_date=get_datetime(from_datetime) if from_datetime else None,
+        to_date=get_datetime(to_datetime) if to_datetime else None,
+        order=(key, dirn),
+        limit=limit + 1,  # one extra to compute has_more
+        offset=offset,
+        after=after,
     )
 
     has_more = len(rows) > limit
     items = rows[:limit]
+    next_cursor = page_cursor(key, dirn, items[-1]) if has_more else None
 
     # ---- enrichment (optional) ----
     if str(include_property) in ("1", "true", "True") and items:
@@ -357,9 +359,10 @@ def list_bookings(
             "offset": offset,
             "limit": limit,
             "has_more": has_more,
-            "next_offset": (offset + limit) if has_more else None,
+            "next_offset": (offset + limit) if has_more and not cursor else None,
             "order_by": ob,
         },
+        "next_cursor": next_cursor,
         "filters_applied": {
             "property": property,
             "user": user,
@@ -406,10 +409,7 @@ def cancel_booking(name: str | None = None,
         }
         # If caller is not System Manager or property host, restrict by user
         session_user = frappe.session.user
-        roles = set(frappe.get_roles(session_user))
-        prop_host = frappe.db.get_value("Property", property, "host")
-
-        if "System Manager" in roles or session_user == prop_host:
+        if "System Manager" in auth.roles() or auth.owns_property(property):
             # ok to search broadly
             pass
         else:
@@ -426,13 +426,10 @@ def cancel_booking(name: str | None = None,
 
     # permission: booker, property host, or System Manager
     session_user = frappe.session.user
-    roles = set(frappe.get_roles(session_user))
-    prop_host = frappe.db.get_value("Property", booking.property, "host")
-
     allowed = (
-        "System Manager" in roles
+        "System Manager" in auth.roles()
         or session_user == booking.user
-        or session_user == prop_host
+        or auth.owns_property(booking.property)
     )
     if not allowed:
         frappe.local.response["http_status_code"] = 403
@@ -450,13 +447,122 @@ def cancel_booking(name: str | None = None,
     frappe.db.commit()
     return {"ok": True, "message": "Booking cancelled.", "booking": booking.name}
 
-def _exists_booking_day(property_name: str, d):
-    return frappe.db.exists("Booking", {"property": property_name, "booking_date": d, "status": "Active"})
+MAX_BULK_CANCEL = 1000
+CANCEL_FIELDS = ["status", "cancel_reason", "cancelled_by", "cancelled_at"]
+
+# POST /api/method/cumbrian_dreams.api.bulk_cancel_bookings
+# Body can be:
+#   {"names":["BOOK-0001","BOOK-0002"], "cancel_reason":"..."}
+# OR (every Active booking of a property in a date range, e.g. a maintenance week)
+#   {"property":"PROP-0001","from_date":"2025-09-01","to_date":"2025-09-07","cancel_reason":"..."}
+# Same permission rule as cancel_booking, checked per row. One UPDATE, one commit.
+# results: [{"name":..., "result": "cancelled" | "already_cancelled" | "not_permitted" | "not_found"}]
+@frappe.whitelist(methods=["POST"])
+def bulk_cancel_bookings(names=None,
+                         property: str | None = None,
+                         from_date: str | None = None,
+                         to_date: str | None = None,
+                         cancel_reason: str | None = None):
+    names = frappe.parse_json(names) if isinstance(names, str) else names
+    fields = ["name", "property", "user", "booking_date", *CANCEL_FIELDS]
+    session_user = frappe.session.user
+    is_sm = "System Manager" in auth.roles()
+
+    if names:
+        if not isinstance(names, list) or len(names) > MAX_BULK_CANCEL:
+            frappe.local.response["http_status_code"] = 400
+            return {"ok": False, "message": f"'names' must be a list of at most {MAX_BULK_CANCEL} bookings."}
+        names = list(dict.fromkeys(str(n) for n in names))
+        rows = frappe.get_all("Booking", filters={"name": ["in", names]}, fields=fields, for_update=True)
+    elif property and from_date:
+        try:
+            start = getdate(from_date)
+            end = getdate(to_date) if to_date else start
+        except Exception:
+            frappe.local.response["http_status_code"] = 400
+            return {"ok": False, "message": "Dates must be YYYY-MM-DD."}
+        filters = {"property": property, "status": "Active", "booking_date": ["between", [start, end]]}
+        if not (is_sm or auth.owns_property(property)):
+            # not their property: only their own bookings in the range
+            filters["user"] = session_user
+        rows = frappe.get_all("Booking", filters=filters, fields=fields, order_by="booking_date asc",
+                              limit_page_length=MAX_BULK_CANCEL + 1, for_update=True)
+        if len(rows) > MAX_BULK_CANCEL:
+            frappe.local.response["http_status_code"] = 400
+            return {"ok": False, "message": f"More than {MAX_BULK_CANCEL} bookings in range; narrow the dates."}
+        names = [r["name"] for r in rows]
+    else:
+        frappe.local.response["http_status_code"] = 400
+        return {"ok": False, "message": "Provide either 'names' OR ('property' + 'from_date')."}
+
+    by_name = {r["name"]: r for r in rows}
+    results, to_cancel = [], []
+    for name in names:
+        row = by_name.get(name)
+        if row is None:
+            result = "not_found"
+        # same rule as cancel_booking; owns_property is memoized per property for the request
+        elif not (is_sm or row["user"] == session_user or auth.owns_property(row["property"])):
+            result = "not_permitted"
+        elif row["status"] == "Cancelled":
+            result = "already_cancelled"
+        else:
+            result = "cancelled"
+            to_cancel.append(row)
+        results.append({"name": name, "result": result})
+
+    summary = {}
+    for r in results:
+        summary[r["result"]] = summary.get(r["result"], 0) + 1
+    if not to_cancel:
+        return {"ok": True, "message": "Nothing to cancel.", "summary": summary, "results": results}
+
+    # rows are locked (for_update) until commit, so the values read above are current
+    now = now_datetime()
+    new = {"status": "Cancelled", "cancel_reason": cancel_reason, "cancelled_by": session_user, "cancelled_at": now}
+    booking = frappe.qb.DocType("Booking")
+    update = frappe.qb.update(booking).set(booking.modified, now).set(booking.modified_by, session_user)
+    for field, value in new.items():
+        update = update.set(booking[field], value)
+    update.where(booking.name.isin([r["name"] for r in to_cancel])).where(booking.status == "Active").run()
+
+    # the UPDATE skips Document.save: write the Version rows it would have written, in one insert
+    frappe.db.bulk_insert(
+        "Version",
+        fields=["name", "creation", "modified", "owner", "modified_by", "ref_doctype", "docname", "data"],
+        values=[
+            (frappe.generate_hash(length=10), now, now, session_user, session_user, "Booking", r["name"],
+             frappe.as_json({
+                 "added": [], "removed": [], "row_changed": [],
+                 "changed": [[f, r[f], new[f]] for f in CANCEL_FIELDS if r[f] != new[f]],
+             }))
+            for r in to_cancel
+        ],
+    )
+
+    # ...and the doc_events: listing generation and availability bitmaps
+    bump_availability_generation()
+    by_property = {}
+    for r in to_cancel:
+        by_property.setdefault(r["property"], []).append(r["booking_date"])
+
+    def _refresh():
+        for prop, days in by_property.items():
+            availability.refresh_days(prop, days)
+
+    frappe.db.after_commit.add(_refresh)
+    frappe.db.commit()
+    return {"ok": True, "message": f"{len(to_cancel)} booking(s) cancelled.", "summary": summary, "results": results}
 
 @frappe.whitelist(allow_guest=True, methods=["GET"])
 def is_property_available(property: str, booking_date: str):
     d = getdate(booking_date)
-    available = not _exists_booking_day(property, d)
+    # the Property lookup only happens when the year's bitmap isn't loaded yet
+    try:
+        available = not availability.is_booked(property, d)
+    except frappe.DoesNotExistError:
+        frappe.local.response["http_status_code"] = 404
+        return {"ok": False, "message": "Property not found."}
     return {"ok": True, "property": property, "booking_date": str(d), "available": available}
 
 def book_property(property: str, user: str | None = None, booking_date: str | None = None, payment_completed: int = 0):
@@ -465,27 +571,11 @@ def book_property(property: str, user: str | None = None, booking_date: str | No
        - Host (but only for properties they host)
     """
     d = getdate(booking_date)
-
-    # prevent double-book
-    if frappe.db.exists("Booking", {"property": property, "booking_date": d, "status": "Active"}):
-        frappe.local.response["http_status_code"] = 409
-        return {"ok": False, "message": "Property already booked for that date."}
-
     session_user = frappe.session.user
 
     # If no user provided, default to session user
     target_user = user or session_user
-
-    # If booking for someone else, enforce permissions
-    if target_user != session_user:
-        # System Manager/Support always allowed
-        if _user_has_any(ALLOWED_ROLES_DELEGATED):
-            # Hosts can only book for their own properties
-            if "Host" in frappe.get_roles(session_user):
-                if not _property_owned_by_user(property, session_user):
-                    raise frappe.PermissionError("Hosts can only book for their own properties.")
-        else:
-            raise frappe.PermissionError("You are not allowed to book on behalf of another user.")
+    _check_booking_delegation(property, target_user)
 
     doc = frappe.get_doc({
         "doctype": "Booking",
@@ -495,32 +585,116 @@ def book_property(property: str, user: str | None = None, booking_date: str | No
         "payment_completed": int(payment_completed) or 0,
         "status": "Active",
     })
-    doc.insert()  # normal permission checks apply
+    # optimistic: the unique active-slot index rejects a double-book, no pre-check round-trip
+    doc.flags.skip_duplicate_check = True
+    frappe.db.savepoint("book_property")
+    try:
+        doc.insert()  # normal permission checks apply
+    except frappe.UniqueValidationError as e:
+        if not is_active_slot_violation(e.__context__ or e):
+            raise
+        frappe.db.rollback(save_point="book_property")
+        frappe.clear_messages()
+        frappe.local.response["http_status_code"] = 409
+        return {"ok": False, "message": "Property already booked for that date."}
     frappe.db.commit()
     return {"ok": True, "message": "Booking confirmed.", "booking": {"name": doc.name}}
 
+def _check_booking_delegation(property: str, target_user: str):
+    """Booking for someone else: System Manager / Support, or a Host for their own properties."""
+    session_user = frappe.session.user
+    if target_user == session_user:
+        return
+    # System Manager/Support always allowed
+    if _user_has_any(ALLOWED_ROLES_DELEGATED):
+        # Hosts can only book for their own properties
+        if "Host" in auth.roles():
+            if not _property_owned_by_user(property, session_user):
+                raise frappe.PermissionError("Hosts can only book for their own properties.")
+    else:
+        raise frappe.PermissionError("You are not allowed to book on behalf of another user.")
+
+# POST /api/method/cumbrian_dreams.api.book_stay
+# Body: {"property":"PROP-0001","check_in":"2025-09-01","check_out":"2025-09-08","user":"guest1@..."}
+# One Booking per night in [check_in, check_out); all nights or none.
+@frappe.whitelist(methods=["POST"])
+def book_stay(property: str, check_in: str, check_out: str, user: str | None = None, payment_completed: int = 0):
+    try:
+        start, end = stay_range(check_in, check_out)
+    except (TypeError, frappe.ValidationError):
+        frappe.clear_messages()
+        frappe.local.response["http_status_code"] = 400
+        return {"ok": False, "message": "Provide check_in and a later check_out (YYYY-MM-DD)."}
+    nights = [start + timedelta(days=i) for i in range((end - start).days)]
+
+    target_user = user or frappe.session.user
+    frappe.has_permission("Booking", "create", throw=True)
+    _check_booking_delegation(property, target_user)
+    # bulk_insert below skips Link validation
+    if not frappe.db.exists("User", target_user):
+        frappe.throw(f"User {target_user} does not exist", exc=frappe.ValidationError)
+
+    # row lock on the Property: concurrent bookings for it queue here until we commit
+    if not frappe.db.get_value("Property", property, "name", for_update=True):
+        frappe.local.response["http_status_code"] = 404
+        return {"ok": False, "message": "Property not found."}
+
+    taken = frappe.get_all(
+        "Booking",
+        filters={"property": property, "status": "Active", "booking_date": ["between", [start, nights[-1]]]},
+        pluck="booking_date",
+        order_by="booking_date asc",
+    )
+    if taken:
+        frappe.local.response["http_status_code"] = 409
+        return {"ok": False, "message": "Property already booked for part of that stay.",
+                "dates": [str(d) for d in taken]}
+
+    now = now_datetime()
+    session_user = frappe.session.user
+    names = reserve_series("BOOK-", len(nights), 8)
+    try:
+        frappe.db.bulk_insert(
+            "Booking",
+            fields=["name", "creation", "modified", "owner", "modified_by",
+                    "property", "user", "booking_date", "payment_completed", "status"],
+            values=[
+                (name, now, now, session_user, session_user,
+                 property, target_user, d, cint(payment_completed), "Active")
+                for name, d in zip(names, nights, strict=True)
+            ],
+        )
+    except Exception as e:
+        # a single-night book_property (which doesn't take the lock) won a night
+        if not is_active_slot_violation(e):
+            raise
+        frappe.db.rollback()
+        frappe.local.response["http_status_code"] = 409
+        return {"ok": False, "message": "Property already booked for part of that stay."}
+    # bulk_insert skips doc_events: refresh the listing generation and bitmap ourselves
+    bump_availability_generation()
+    frappe.db.after_commit.add(lambda: availability.refresh_days(property, nights))
+    frappe.db.commit()
+    return {"ok": True, "message": "Stay booked.", "check_in": str(start), "check_out": str(end),
+            "bookings": [{"name": n, "booking_date": str(d)} for n, d in zip(names, nights, strict=True)]}
+
 # GET /api/method/cumbrian_dreams.api.get_unavailable_dates?property=PROP-0001&from_date=2025-09-01&to_date=2025-09-30
 @frappe.whitelist(allow_guest=True, methods=["GET"])
 def get_unavailable_dates(property: str, from_date: str, to_date: str):
     fd, td = getdate(from_date), getdate(to_date)
-    rows = frappe.get_all(
-        "Booking",
-        filters={
-            "property": property,
-            "status": "Active",
-            "booking_date": ["between", [fd, td]],
-        },
-        pluck="booking_date"
-    )
-    # Ensure ISO strings
-    return {"ok": True, "property": property, "dates": [str(d) for d in rows]}
+    # ISO strings, from the per-year bitmap (span capped at availability.MAX_SPAN_DAYS)
+    try:
+        dates = availability.booked_dates(property, fd, td)
+    except frappe.DoesNotExistError:
+        frappe.local.response["http_status_code"] = 404
+        return {"ok": False, "message": "Property not found."}
+    return {"ok": True, "property": property, "dates": dates}
 
 def _user_has_any(roles: set[str]) -> bool:
-    user_roles = set(frappe.get_roles(frappe.session.user))
-    return bool(user_roles & roles)
+    return auth.has_any_role(*roles)
 
 def _property_owned_by_user(prop: str, user: str) -> bool:
-    return frappe.db.exists("Property", {"name": prop, "host": user})
+    return auth.owns_property(prop, user)
 
 # Create Property
 @frappe.whitelist(methods=["POST"])
@@ -534,7 +708,7 @@ def create_property(title: str, price_per_night: float, location: str,
     if user == "Guest":
         raise frappe.PermissionError("Login required.")
 
-    roles = set(frappe.get_roles(user))
+    roles = auth.roles(user)
     is_sm = "System Manager" in roles
     is_host = "Host" in roles
 
@@ -587,7 +761,7 @@ def update_property(name: str,
     if user == "Guest":
         raise frappe.PermissionError("Login required.")
 
-    roles = set(frappe.get_roles(user))
+    roles = auth.roles(user)
     is_sm = "System Manager" in roles
     is_host_role = "Host" in roles
 
@@ -640,7 +814,7 @@ def delete_property(name: str):
     if user == "Guest":
         raise frappe.PermissionError("Login required.")
 
-    roles = set(frappe.get_roles(user))
+    roles = auth.roles(user)
     is_sm = "System Manager" in roles
     is_host_role = "Host" in roles
 
@@ -667,22 +841,9 @@ def delete_property(name: str):
     frappe.db.commit()
     return {"ok": True, "message": "Property deleted."}
 
-import frappe
-from datetime import datetime, timedelta
-from urllib.parse import quote
+BATCH_MAX_PROPERTIES = 50
 
-@frappe.whitelist(allow_guest=True)
-def fetch_external_availability(property_id: str, from_date: str, to_date: str):
-    """
-    Chunked proxy for FreeToBook per-property availability.
-    - Accepts up to multi-year ranges from the frontend.
-    - Splits into <=186-day chunks upstream (uses 180 to be safe).
-    - Warms cookies on the property page and uses browser-like headers.
-    - Merges results and returns one combined list.
-    """
-    # ---- validate inputs ----
-    if not property_id:
-        frappe.throw("Missing property_id", exc=frappe.ValidationError)
+def _parse_availability_range(from_date: str, to_date: str):
     if not from_date or not to_date:
         frappe.throw("Missing from_date/to_date", exc=frappe.ValidationError)
     try:
@@ -692,96 +853,174 @@ def fetch_external_availability(property_id: str, from_date: str, to_date: str):
         frappe.throw("Invalid date format. Use YYYY-MM-DD.", exc=frappe.ValidationError)
     if start > end:
         frappe.throw("from_date must be <= to_date", exc=frappe.ValidationError)
+    return start, end
+
+def _upstream_error_message(e) -> str:
+    """Log an upstream failure (as the proxy always has) and return the user-facing message."""
+    if isinstance(e, freetobook.UpstreamUnavailable):
+        # breaker open (or a shared fetch failed) and nothing cached: fail fast, don't log
+        return str(e)
+    if isinstance(e, freetobook.UpstreamNonJSON):
+        frappe.log_error(e.body, "FTB availability non-JSON")
+        return "Upstream did not return JSON."
+    if isinstance(e, requests.HTTPError):
+        resp = getattr(e, "response", None)
+        status = getattr(resp, "status_code", "???")
+        body = getattr(resp, "text", "")[:800]
+        frappe.log_error(f"FTB HTTP {status}: {body}", "fetch_external_availability")
+        return "Failed to fetch availability (HTTP)."
+    frappe.log_error(f"FTB network error: {e}", "fetch_external_availability")
+    return "Failed to fetch availability (network)."
 
-    base = f"https://freetobook.com/booking-pages/property/{quote(str(property_id))}"
-    avail_url = f"{base}/availability"
-
-    # Browser-like headers; Referer must be the property page
-    UA = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-          "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36")
-    headers_page = {
-        "User-Agent": UA,
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-        "Accept-Language": "en-GB,en;q=0.9",
-    }
-    headers_api = {
-        "User-Agent": UA,
-        "Accept": "application/json",
-        "Accept-Language": "en-GB,en;q=0.9",
-        "Origin": "https://freetobook.com",
-        "Referer": base,
-        "X-Requested-With": "XMLHttpRequest",
-    }
-
-    # ---- perform chunked fetch ----
-    CHUNK_DAYS = 180  # <=186 per FTB constraint
-    merged_by_date = {}  # date -> entry
+@frappe.whitelist(allow_guest=True)
+def fetch_external_availability(property_id: str, from_date: str, to_date: str, format: str | None = None):
+    """
+    Chunked, cached proxy for FreeToBook per-property availability.
+    - format=compact returns only the calendar flags as inclusive date ranges:
+      {"closedArr": [[from, to], ...], "closedDep": [...], "stayBlocked": [...]}
+    - Accepts up to multi-year ranges from the frontend.
+    - Splits into 180-day chunks upstream (<=186 per FTB constraint).
+    - Properties ingested by the hourly sync are served from External Availability.
+    - Otherwise each chunk is cached in Redis; stale chunks are served immediately
+      and refreshed in the background (see freetobook.get_availability).
+      Set ftb_live_fallback = 0 to never call upstream from a page view.
+    - Upstream calls share a per-call time budget and a circuit breaker; when
+      upstream is down, last known good data is served with "degraded": true.
+    - Merges results and returns one combined list.
+    """
+    # ---- validate inputs ----
+    if not property_id:
+        frappe.throw("Missing property_id", exc=frappe.ValidationError)
+    start, end = _parse_availability_range(from_date, to_date)
+    compact = (format or "").lower() == "compact"
+    out = {"propertyId": property_id, "fromDate": from_date, "toDate": to_date}
+
+    # ---- local store (filled by tasks.sync_external_availability) ----
+    prop = find_property(property_id)
+    if prop and prop.availability_synced_at:
+        out["syncedAt"] = str(prop.availability_synced_at)
+        if compact:
+            rows = get_external_days(
+                prop.external_property_id, start, end,
+                fields=("closed_to_arrival", "closed_to_departure", "stay_blocked"),
+            )
+            out.update(freetobook.compact_flags(
+                (str(r.date), r.closed_to_arrival, r.closed_to_departure, r.stay_blocked) for r in rows
+            ))
+        else:
+            rows = get_external_days(prop.external_property_id, start, end)
+            out["datedPropertyAvailabilities"] = [json.loads(r.payload) for r in rows if r.payload]
+        return out
+    if not cint(frappe.conf.get("ftb_live_fallback", 1)):
+        # never-synced property and live scraping disabled: nothing to show yet
+        out.update(freetobook.compact_entries([]) if compact else {"datedPropertyAvailabilities": []})
+        return out
 
     try:
-        import requests
-        sess = requests.Session()
-
-        # Warm cookies (non-fatal if it fails)
+        meta = {}
+        out_list = freetobook.get_availability(property_id, start, end, meta=meta)
+        if meta.get("degraded"):
+            out["degraded"] = True  # served last known good data
+        if compact:
+            out.update(freetobook.compact_entries(out_list))
+        else:
+            out["datedPropertyAvailabilities"] = out_list
+        return out
+
+    except (freetobook.UpstreamUnavailable, freetobook.UpstreamNonJSON, requests.RequestException) as e:
+        frappe.throw(_upstream_error_message(e), exc=frappe.ValidationError)
+
+# GET /api/method/cumbrian_dreams.api.fetch_external_availability_batch
+#   ?property_ids=["48596","48748"]&from_date=2025-09-01&to_date=2025-09-05
+# property_ids: JSON list or comma separated (external ids or Property names), max 50.
+# Returns one item per id with the compact flags (or the full list with format=full)
+# and "available": whether a stay arriving from_date and leaving to_date is open
+# (null with "unknown": true when some of those days have no data; "notSynced": true
+# when the property isn't synced and ftb_live_fallback is off).
+@frappe.whitelist(allow_guest=True, methods=["GET"])
+def fetch_external_availability_batch(property_ids, from_date: str, to_date: str, format: str | None = "compact"):
+    if isinstance(property_ids, str):
         try:
-            sess.get(base, headers=headers_page, timeout=12, allow_redirects=True)
-        except requests.RequestException:
-            pass
-
-        cur = start
-        while cur <= end:
-            chunk_end = min(cur + timedelta(days=CHUNK_DAYS - 1), end)
-            params = {
-                "from_date": cur.strftime("%Y-%m-%d"),
-                "to_date":   chunk_end.strftime("%Y-%m-%d"),
+            property_ids = json.loads(property_ids)
+        except ValueError:
+            property_ids = property_ids.split(",")
+    if not isinstance(property_ids, list):
+        property_ids = [property_ids]
+    ids = list(dict.fromkeys(str(p).strip() for p in property_ids if str(p).strip()))
+    if not ids:
+        frappe.throw("Missing property_ids", exc=frappe.ValidationError)
+    if len(ids) > BATCH_MAX_PROPERTIES:
+        frappe.throw(f"At most {BATCH_MAX_PROPERTIES} property_ids per call.", exc=frappe.ValidationError)
+    start, end = _parse_availability_range(from_date, to_date)
+    compact = (format or "compact").lower() == "compact"
+
+    # day -> (closed_arr, closed_dep, stay_blocked) per id, plus the response body
+    flags, items, errors = {}, {}, {}
+
+    # ---- local store: one query for every synced property ----
+    props = find_properties(ids)
+    synced = {pid: p for pid, p in props.items() if p and p.availability_synced_at}
+    fields = ("closed_to_arrival", "closed_to_departure", "stay_blocked") + (() if compact else ("payload",))
+    stored = get_days_many({p.external_property_id for p in synced.values()}, start, end, fields=fields)
+    for pid, p in synced.items():
+        rows = stored.get(str(p.external_property_id), [])
+        flags[pid] = {str(r.date): (r.closed_to_arrival, r.closed_to_departure, r.stay_blocked) for r in rows}
+        items[pid] = {"syncedAt": str(p.availability_synced_at)}
+        if not compact:
+            items[pid]["datedPropertyAvailabilities"] = [json.loads(r.payload) for r in rows if r.payload]
+
+    # ---- the rest: chunk cache, missing chunks fetched concurrently ----
+    live = [pid for pid in ids if pid not in synced]
+    if live and cint(frappe.conf.get("ftb_live_fallback", 1)):
+        meta = {}
+        for pid, result in freetobook.get_availability_many(live, start, end, meta=meta).items():
+            if isinstance(result, Exception):
+                errors[pid] = _upstream_error_message(result)
+                continue
+            flags[pid] = {
+                freetobook.entry_date(e): freetobook.summarize_entry(e)
+                for e in result if freetobook.entry_date(e)
             }
+            items[pid] = {"degraded": True} if meta.get(pid, {}).get("degraded") else {}
+            if not compact:
+                items[pid]["datedPropertyAvailabilities"] = result
+    else:
+        for pid in live:
+            flags[pid], items[pid] = {}, {"notSynced": True}
+
+    check_in, check_out = start.isoformat(), end.isoformat()
+    for pid, item in items.items():
+        days = flags[pid]
+        if compact:
+            item.update(freetobook.compact_flags((d, *days[d]) for d in sorted(days)))
+        if start >= end:
+            item["available"] = None
+        elif freetobook.days_cover(days, check_in, check_out):
+            item["available"] = freetobook.stay_available(days, check_in, check_out)
+        else:
+            # no data for part of the stay (not synced, or nothing stored for the range): don't guess "open"
+            item["available"] = None
+            item["unknown"] = True
 
-            r = sess.get(avail_url, params=params, headers=headers_api, timeout=15, allow_redirects=True)
-            if r.status_code == 403:
-                # retry without X-Requested-With (some stacks dislike it)
-                hdr_retry = dict(headers_api)
-                hdr_retry.pop("X-Requested-With", None)
-                r = sess.get(avail_url, params=params, headers=hdr_retry, timeout=15, allow_redirects=True)
-
-            r.raise_for_status()
-            try:
-                data = r.json()
-            except ValueError:
-                frappe.log_error(r.text[:800], "FTB availability non-JSON")
-                frappe.throw("Upstream did not return JSON.", exc=frappe.ValidationError)
-
-            # Extract list in either camelCase or snake_case
-            arr = []
-            if isinstance(data, dict):
-                arr = (data.get("datedPropertyAvailabilities")
-                       or data.get("dated_property_availabilities")
-                       or [])
-            elif isinstance(data, list):
-                arr = data
-
-            for entry in arr:
-                date_str = (entry.get("date")
-                            or entry.get("Date"))
-                if not date_str:
-                    continue
-                merged_by_date[date_str] = entry  # last one wins if dup
-
-            cur = chunk_end + timedelta(days=1)
-
-        # Build sorted combined list
-        out_list = [merged_by_date[d] for d in sorted(merged_by_date.keys())]
-        return {
-            "propertyId": property_id,
-            "fromDate": from_date,
-            "toDate": to_date,
-            "datedPropertyAvailabilities": out_list,
-        }
+    return {
+        "ok": True,
+        "fromDate": from_date,
+        "toDate": to_date,
+        "items": {pid: items[pid] for pid in ids if pid in items},
+        "errors": errors,
+    }
 
-    except requests.HTTPError as e:
-        resp = getattr(e, "response", None)
-        status = getattr(resp, "status_code", "???")
-        body = getattr(resp, "text", "")[:800]
-        frappe.log_error(f"FTB HTTP {status}: {body}", "fetch_external_availability")
-        frappe.throw("Failed to fetch availability (HTTP).", exc=frappe.ValidationError)
-    except requests.RequestException as e:
-        frappe.log_error(f"FTB network error: {e}", "fetch_external_availability")
-        frappe.throw("Failed to fetch availability (network).", exc=frappe.ValidationError)
+# GET /api/method/cumbrian_dreams.api.get_upstream_stats
+@frappe.whitelist(methods=["GET"])
+def get_upstream_stats():
+    """FreeToBook connection counters, breaker state, latency and listing cache hits (System Manager only)."""
+    if "System Manager" not in auth.roles():
+        raise frappe.PermissionError("System Manager role required.")
+    return {
+        "ok": True,
+        "worker": freetobook.connection_stats(),
+        "site": freetobook.site_connection_stats(),
+        "breaker": freetobook.breaker_state(),
+        "latency": freetobook.latency_histogram(),
+        "listing_cache": listing_cache_stats(),
+    }
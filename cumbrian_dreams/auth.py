@@ -0,0 +1,85 @@
+# apps/cumbrian_dreams/cumbrian_dreams/auth.py
+"""
+Who-is-asking helpers shared by the API and the portal pages.
+
+Roles and property hosts are memoized on frappe.local, so they are looked
+up once per request however many checks run. Each host's property list is
+cached across requests in a Redis hash. Property doc_events drop the
+affected hosts after commit, covering insert, edit, delete and host
+change.
+"""
+import frappe
+
+HOST_PROPERTIES_KEY = "cd:host_properties"
+HOST_PROPERTY_FIELDS = ["name", "title", "location", "price_per_night", "host", "modified"]
+
+
+def _memo() -> dict:
+    if not hasattr(frappe.local, "cd_auth"):
+        frappe.local.cd_auth = {"roles": {}, "property_host": {}, "host_properties": {}}
+    return frappe.local.cd_auth
+
+
+def roles(user: str | None = None) -> frozenset:
+    user = user or frappe.session.user
+    memo = _memo()["roles"]
+    if user not in memo:
+        memo[user] = frozenset(frappe.get_roles(user))
+    return memo[user]
+
+
+def has_any_role(*wanted: str, user: str | None = None) -> bool:
+    return not roles(user).isdisjoint(wanted)
+
+
+def property_host(property_name: str) -> str | None:
+    memo = _memo()["property_host"]
+    if property_name not in memo:
+        memo[property_name] = frappe.db.get_value("Property", property_name, "host")
+    return memo[property_name]
+
+
+def host_properties(host: str) -> list[dict]:
+    """The host's properties (HOST_PROPERTY_FIELDS), newest first."""
+    memo = _memo()["host_properties"]
+    if host not in memo:
+        cache = frappe.cache()
+        rows = cache.hget(HOST_PROPERTIES_KEY, host)
+        if rows is None:
+            rows = frappe.get_all(
+                "Property", filters={"host": host}, fields=HOST_PROPERTY_FIELDS, order_by="modified desc"
+            )
+            cache.hset(HOST_PROPERTIES_KEY, host, rows)
+        memo[host] = rows
+        # seed the per-request host lookup while we have it
+        _memo()["property_host"].update({r["name"]: host for r in rows})
+    return memo[host]
+
+
+def owns_property(property_name: str, user: str | None = None) -> bool:
+    user = user or frappe.session.user
+    return bool(property_name) and property_host(property_name) == user
+
+
+def invalidate_host_properties(doc=None, method=None, *args):
+    """doc_events hook (Property on_update / on_trash / after_rename)."""
+    hosts = set()
+    if doc is not None:
+        hosts.add(doc.get("host"))
+        before = doc.get_doc_before_save() if method == "on_update" else None
+        if before:
+            hosts.add(before.get("host"))  # host change: the old host loses it
+    hosts.discard(None)
+
+    def _drop():
+        if method == "after_rename" or not hosts:
+            frappe.cache().delete_key(HOST_PROPERTIES_KEY)
+        else:
+            for host in hosts:
+                frappe.cache().hdel(HOST_PROPERTIES_KEY, host)
+
+    _drop()  # this request / worker sees the change right away
+    frappe.db.after_commit.add(_drop)  # and nobody re-caches the pre-commit rows
+    memo = _memo()
+    memo["host_properties"].clear()
+    memo["property_host"].pop(doc.name if doc is not None else None, None)
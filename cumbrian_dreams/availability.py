@@ -0,0 +1,145 @@
+# apps/cumbrian_dreams/cumbrian_dreams/availability.py
+"""
+Redis bitmap of Active booking days, one key per property per year.
+
+Bit n is day-of-year n (Jan 1 = 0). Bit READY_BIT marks a bitmap that has
+been loaded from the database, so a missing key or an unloaded year is
+never mistaken for "all free". Booking doc_events re-read the affected
+days from the database after commit and set or clear their bits.
+
+Loading a year checks the Property exists (DoesNotExistError otherwise), so
+a READY bitmap doubles as a cached existence check. Property on_trash and
+after_rename drop the old name's bitmaps.
+
+Only the read endpoints (is_property_available, get_unavailable_dates)
+answer from here. Writes still check the Booking table, which stays the
+source of truth.
+"""
+from datetime import date, timedelta
+
+import frappe
+from frappe.utils import getdate
+
+READY_BIT = 366
+BITMAP_TTL = 7 * 86400
+# longest from/to span booked_dates answers (each year touched may load a bitmap)
+MAX_SPAN_DAYS = 2 * 366
+
+
+def _key(property_name: str, year: int) -> str:
+    return frappe.cache().make_key(f"avail:bm:{property_name}:{year}")
+
+
+def _booked_days(property_name: str, start: date, end: date) -> list[date]:
+    return frappe.get_all(
+        "Booking",
+        filters={"property": property_name, "status": "Active", "booking_date": ["between", [start, end]]},
+        pluck="booking_date",
+    )
+
+
+def _load(property_name: str, year: int):
+    """
+    Build the year's bitmap from the database in a temporary key and RENAME
+    it over the live one. A booking or cancellation committed meanwhile may
+    have had its refresh_days() overwritten by the swap, so the year is read
+    again and the days that changed since the first read are corrected.
+    Only then is READY_BIT set.
+    """
+    if not frappe.db.exists("Property", property_name):
+        # no bitmap (and no Redis key) for names that aren't properties
+        raise frappe.DoesNotExistError(f"Property {property_name} not found")
+    cache = frappe.cache()
+    key = _key(property_name, year)
+    start, end = date(year, 1, 1), date(year, 12, 31)
+
+    first = {getdate(d) for d in _booked_days(property_name, start, end)}
+    tmp = f"{key}:load:{frappe.generate_hash(length=8)}"
+    pipe = cache.pipeline()
+    pipe.setbit(tmp, READY_BIT, 0)  # creates the key even for a year without bookings
+    for d in first:
+        pipe.setbit(tmp, d.timetuple().tm_yday - 1, 1)
+    pipe.rename(tmp, key)
+    pipe.execute()
+
+    second = {getdate(d) for d in _booked_days(property_name, start, end)}
+    pipe = cache.pipeline()
+    for d in first ^ second:
+        pipe.setbit(key, d.timetuple().tm_yday - 1, 1 if d in second else 0)
+    pipe.setbit(key, READY_BIT, 1)
+    pipe.expire(key, BITMAP_TTL)
+    pipe.execute()
+
+
+def _ensure(property_name: str, year: int):
+    if not frappe.cache().getbit(_key(property_name, year), READY_BIT):
+        _load(property_name, year)
+
+
+def is_booked(property_name: str, d) -> bool:
+    """Whether `d` has an Active booking. Raises DoesNotExistError for an unknown property."""
+    d = getdate(d)
+    key = _key(property_name, d.year)
+    cache = frappe.cache()
+    ready, booked = cache.pipeline().getbit(key, READY_BIT).getbit(key, d.timetuple().tm_yday - 1).execute()
+    if not ready:
+        _load(property_name, d.year)
+        booked = cache.getbit(key, d.timetuple().tm_yday - 1)
+    return bool(booked)
+
+
+def booked_dates(property_name: str, from_date, to_date) -> list[str]:
+    """ISO dates in [from_date, to_date] with an Active booking, ascending (DoesNotExistError as is_booked)."""
+    start, end = getdate(from_date), getdate(to_date)
+    if (end - start).days > MAX_SPAN_DAYS:
+        frappe.throw(f"Date range is limited to {MAX_SPAN_DAYS} days", exc=frappe.ValidationError)
+    cache = frappe.cache()
+    out = []
+    for year in range(start.year, end.year + 1):
+        _ensure(property_name, year)
+        lo = max(start, date(year, 1, 1))
+        hi = min(end, date(year, 12, 31))
+        first, last = lo.timetuple().tm_yday - 1, hi.timetuple().tm_yday - 1
+        raw = cache.getrange(_key(property_name, year), first // 8, last // 8) or b""
+        for bit in range(first, last + 1):
+            byte = bit // 8 - first // 8
+            if byte < len(raw) and raw[byte] & (0x80 >> (bit % 8)):
+                out.append((date(year, 1, 1) + timedelta(days=bit)).isoformat())
+    return out
+
+
+def refresh_days(property_name: str, days):
+    """Re-read `days` for one property from the database and update their bits."""
+    days = sorted({getdate(d) for d in days if d})
+    if not property_name or not days:
+        return
+    booked = {getdate(d) for d in _booked_days(property_name, days[0], days[-1])}
+    pipe = frappe.cache().pipeline()
+    for d in days:
+        key = _key(property_name, d.year)
+        pipe.setbit(key, d.timetuple().tm_yday - 1, 1 if d in booked else 0)
+        pipe.expire(key, BITMAP_TTL)
+    pipe.execute()
+
+
+def on_booking_change(doc, method=None):
+    """doc_events hook (Booking on_update / on_trash): refresh the touched days after commit."""
+    touched = {(doc.property, doc.booking_date)}
+    before = doc.get_doc_before_save() if method != "on_trash" else None
+    if before:
+        touched.add((before.property, before.booking_date))
+
+    def _refresh():
+        by_property = {}
+        for prop, d in touched:
+            by_property.setdefault(prop, []).append(d)
+        for prop, days in by_property.items():
+            refresh_days(prop, days)
+
+    frappe.db.after_commit.add(_refresh)
+
+
+def on_property_removed(doc, method=None, *args):
+    """doc_events hook (Property on_trash / after_rename): drop the old name's bitmaps after commit."""
+    name = args[0] if method == "after_rename" and args else doc.name
+    frappe.db.after_commit.add(lambda: frappe.cache().delete_keys(f"avail:bm:{name}:"))
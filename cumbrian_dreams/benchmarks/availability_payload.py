@@ -0,0 +1,46 @@
+# apps/cumbrian_dreams/cumbrian_dreams/benchmarks/availability_payload.py
+"""
+Payload size / parse time of fetch_external_availability: full vs compact.
+
+    bench --site <site> execute cumbrian_dreams.benchmarks.availability_payload.run
+    bench --site <site> execute cumbrian_dreams.benchmarks.availability_payload.run --kwargs "{'property_id': '48596'}"
+
+Without a property_id a synthetic two-year calendar shaped like the FreeToBook
+response is used (2 units, 3 pseudo units each, ~30% of nights booked).
+"""
+import gzip
+import json
+import time
+from datetime import date, timedelta
+
+from cumbrian_dreams import freetobook
+from cumbrian_dreams.benchmarks.ftb_standin import synthetic_entries
+
+
+def _measure(payload: dict, repeat: int) -> dict:
+    body = json.dumps(payload, separators=(",", ":")).encode()
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        json.loads(body)
+    parse_ms = (time.perf_counter() - t0) * 1000 / repeat
+    return {"bytes": len(body), "gzip_bytes": len(gzip.compress(body)), "parse_ms": round(parse_ms, 3)}
+
+
+def run(property_id: str | None = None, days: int = 730, repeat: int = 200) -> dict:
+    if property_id:
+        start = date.today()
+        entries = freetobook.get_availability(property_id, start, start + timedelta(days=days))
+    else:
+        entries = synthetic_entries(date.today(), days)
+
+    full = _measure({"datedPropertyAvailabilities": entries}, repeat)
+    compact = _measure(freetobook.compact_entries(entries), repeat)
+    result = {
+        "days": len(entries),
+        "full": full,
+        "compact": compact,
+        "size_ratio": round(full["bytes"] / max(1, compact["bytes"]), 1),
+        "gzip_ratio": round(full["gzip_bytes"] / max(1, compact["gzip_bytes"]), 1),
+    }
+    print(json.dumps(result, indent=2))
+    return result
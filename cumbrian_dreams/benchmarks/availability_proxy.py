@@ -0,0 +1,134 @@
+# apps/cumbrian_dreams/cumbrian_dreams/benchmarks/availability_proxy.py
+"""
+End-to-end latency / throughput of the availability proxy under concurrency.
+
+Start the FreeToBook stand-in and point the site at it (see ftb_standin), then:
+
+    bench --site <site> execute cumbrian_dreams.benchmarks.availability_proxy.run \\
+        --kwargs "{'site_url': 'http://localhost:8000', 'property_ids': ['48596'], 'concurrency': 16}"
+
+Each request goes through the web workers over HTTP, so caching, single-flight
+and the breaker are all exercised. When `standin_url` is given, the number of
+upstream calls the run caused is read from the stand-in's /__stats.
+
+Record real responses for replay (writes <out_dir>/<property_id>.json):
+
+    bench --site <site> execute cumbrian_dreams.benchmarks.availability_proxy.record \\
+        --kwargs "{'property_id': '48596', 'out_dir': 'ftb-fixtures'}"
+"""
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import requests
+
+from cumbrian_dreams import freetobook
+
+ENDPOINT = "/api/method/cumbrian_dreams.api.fetch_external_availability"
+
+
+def _percentile(values: list[float], pct: float) -> float | None:
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, round(pct / 100 * (len(values) - 1)))], 1)
+
+
+def _standin_stats(standin_url: str | None) -> dict:
+    if not standin_url:
+        return {}
+    return requests.get(f"{standin_url.rstrip('/')}/__stats", timeout=5).json()
+
+
+def run(
+    site_url: str = "http://localhost:8000",
+    property_ids: list | None = None,
+    concurrency: int = 8,
+    requests_total: int = 200,
+    days: int = 730,
+    format: str = "compact",
+    standin_url: str | None = None,
+    seed: int = 7,
+) -> dict:
+    """Fire `requests_total` calls from `concurrency` clients at random properties and windows."""
+    property_ids = [str(p) for p in (property_ids or ["48596"])]
+    rnd = random.Random(seed)
+    today = date.today()
+    calls = []
+    for _ in range(requests_total):
+        # calendar views start at a month boundary within the first year
+        start = today.replace(day=1) + timedelta(days=31 * rnd.randint(0, 11))
+        start = start.replace(day=1)
+        calls.append({
+            "property_id": rnd.choice(property_ids),
+            "from_date": start.isoformat(),
+            "to_date": (start + timedelta(days=days)).isoformat(),
+            "format": format,
+        })
+
+    url = f"{site_url.rstrip('/')}{ENDPOINT}"
+    upstream_before = _standin_stats(standin_url)
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+    session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+
+    def _one(params):
+        t0 = time.perf_counter()
+        try:
+            r = session.get(url, params=params, timeout=60)
+            status = r.status_code
+            degraded = status == 200 and bool((r.json().get("message") or {}).get("degraded"))
+        except requests.RequestException:
+            status, degraded = "error", False
+        return (time.perf_counter() - t0) * 1000, status, degraded
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(_one, calls))
+    wall = time.perf_counter() - t0
+
+    latencies = [ms for ms, status, _ in results if status == 200]
+    statuses = {}
+    for _, status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    upstream_after = _standin_stats(standin_url)
+
+    result = {
+        "requests": len(results),
+        "concurrency": concurrency,
+        "properties": len(property_ids),
+        "wall_s": round(wall, 2),
+        "throughput_rps": round(len(results) / wall, 1) if wall else None,
+        "latency_ms": {
+            "p50": _percentile(latencies, 50),
+            "p95": _percentile(latencies, 95),
+            "p99": _percentile(latencies, 99),
+            "max": round(max(latencies), 1) if latencies else None,
+        },
+        "status": statuses,
+        "degraded": sum(1 for *_, degraded in results if degraded),
+    }
+    if standin_url:
+        result["upstream"] = {
+            k: upstream_after.get(k, 0) - upstream_before.get(k, 0) for k in upstream_after
+        }
+    print(json.dumps(result, indent=2))
+    return result
+
+
+def record(property_id: str, from_date: str | None = None, to_date: str | None = None,
+           out_dir: str = "ftb-fixtures") -> str:
+    """Fetch a property's calendar from the configured upstream and save it as a stand-in fixture."""
+    start = date.fromisoformat(from_date) if from_date else date.today()
+    end = date.fromisoformat(to_date) if to_date else start + timedelta(days=730)
+    entries = freetobook.get_availability(property_id, start, end, allow_stale=False)
+
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"{property_id}.json")
+    with open(path, "w") as f:
+        json.dump({"datedPropertyAvailabilities": entries}, f)
+    print(f"recorded {len(entries)} days to {path}")
+    return path
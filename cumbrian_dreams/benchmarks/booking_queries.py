@@ -0,0 +1,126 @@
+# apps/cumbrian_dreams/cumbrian_dreams/benchmarks/booking_queries.py
+"""
+Host booking listing: property IN-list vs a join on Property.
+
+    bench --site <site> execute cumbrian_dreams.benchmarks.booking_queries.run
+    bench --site <site> execute cumbrian_dreams.benchmarks.booking_queries.run --kwargs "{'sizes': [10, 1000], 'repeat': 50}"
+
+For each size a throwaway host gets that many properties, each with
+`bookings_per_property` Active bookings. The rows are committed (InnoDB only
+indexes FULLTEXT changes on commit) and deleted again when the run ends.
+
+Both shapes fetch the first page of list_bookings (Active, booking_date
+desc, 51 rows), by host and by host plus a `q` word:
+
+- in_list: pluck the host's (and q's) property names, then
+  `property in (...)` on Booking, as list_bookings used to.
+- join: search_bookings(), one query joining Property.
+
+Times are the median of `repeat` runs and include the pluck for in_list.
+"""
+import json
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+import frappe
+from frappe.utils import now_datetime
+
+from cumbrian_dreams.search import bump_listing_generation, search_bookings, text_match
+
+FIELDS = ["name", "property", "user", "booking_date", "payment_completed", "status", "modified"]
+PAGE = 51
+LOCATIONS = ("Keswick", "Ambleside", "Windermere", "Coniston", "Grasmere", "Cockermouth")
+Q = "Keswick"
+
+
+def _seed(prefix: str, host: str, guest: str, size: int, bookings_per_property: int, seed: int):
+    rnd = random.Random(seed)
+    now = now_datetime()
+    start = date.today()
+    props, bookings = [], []
+    for i in range(size):
+        name = f"{prefix}P{i:06d}"
+        props.append((name, now, now, "Administrator", "Administrator", f"{prefix} cottage {i}",
+                      host, rnd.choice(LOCATIONS), rnd.randint(40, 400)))
+        for day in rnd.sample(range(365), bookings_per_property):
+            bookings.append((f"{prefix}B{len(bookings):08d}", now, now, "Administrator", "Administrator",
+                             name, guest, start + timedelta(days=day), "Active", 0))
+    frappe.db.bulk_insert(
+        "Property",
+        ["name", "creation", "modified", "owner", "modified_by", "title", "host", "location", "price_per_night"],
+        props,
+    )
+    frappe.db.bulk_insert(
+        "Booking",
+        ["name", "creation", "modified", "owner", "modified_by", "property", "user", "booking_date", "status",
+         "payment_completed"],
+        bookings,
+    )
+    frappe.db.commit()
+
+
+def _cleanup(prefix: str):
+    frappe.db.delete("Booking", {"name": ["like", f"{prefix}%"]})
+    frappe.db.delete("Property", {"name": ["like", f"{prefix}%"]})
+    bump_listing_generation()  # listing pages cached while the rows existed
+    frappe.db.commit()
+
+
+def _in_list(host: str, q: str | None) -> tuple[list, int]:
+    names = frappe.get_all("Property", filters={"host": host}, pluck="name")
+    if q:
+        prop = frappe.qb.DocType("Property")
+        matching = frappe.qb.from_(prop).select(prop.name).where(text_match(prop, q)[0]).run(pluck=True)
+        names = list(set(names) & set(matching))
+    kwargs = dict(
+        fields=FIELDS,
+        filters=[["Booking", "status", "=", "Active"], ["Booking", "property", "in", names]],
+        order_by="booking_date desc, name desc",
+        limit_page_length=PAGE,
+    )
+    sql = frappe.get_all("Booking", run=0, **kwargs)
+    return frappe.get_all("Booking", **kwargs), len(sql)
+
+
+def _join(host: str, q: str | None) -> tuple[list, int]:
+    kwargs = dict(status="Active", host=host, q=q, limit=PAGE)
+    sql = str(search_bookings(FIELDS, run=False, **kwargs))
+    return search_bookings(FIELDS, **kwargs), len(sql)
+
+
+def _median_ms(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return round(statistics.median(times), 2)
+
+
+def run(sizes: list | None = None, bookings_per_property: int = 5, repeat: int = 20, seed: int = 7) -> dict:
+    guest = frappe.db.get_value("User", {"name": ["not in", ["Guest", "Administrator"]]}, "name") or "Administrator"
+    results = []
+    for size in sizes or [10, 1000, 10000]:
+        prefix = f"BENCH-{frappe.generate_hash(length=6)}-"
+        host = f"{prefix.lower()}host@example.com"
+        _seed(prefix, host, guest, int(size), bookings_per_property, seed)
+        try:
+            for label, q in (("host", None), ("host+q", Q)):
+                old_rows, old_sql = _in_list(host, q)
+                new_rows, new_sql = _join(host, q)
+                results.append({
+                    "properties": int(size),
+                    "filter": label,
+                    "in_list_ms": _median_ms(lambda: _in_list(host, q), repeat),
+                    "join_ms": _median_ms(lambda: _join(host, q), repeat),
+                    "in_list_sql_bytes": old_sql,
+                    "join_sql_bytes": new_sql,
+                    "same_rows": [r["name"] for r in old_rows] == [r["name"] for r in new_rows],
+                })
+        finally:
+            _cleanup(prefix)
+
+    print(json.dumps(results, indent=2))
+    return {"results": results}
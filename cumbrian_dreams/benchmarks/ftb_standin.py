@@ -0,0 +1,225 @@
+# apps/cumbrian_dreams/cumbrian_dreams/benchmarks/ftb_standin.py
+"""
+Local stand-in for the two FreeToBook endpoints the proxy calls:
+
+    GET /booking-pages/property/<id>                   (sets a session cookie)
+    GET /booking-pages/property/<id>/availability?from_date=&to_date=
+
+Responses are replayed from recorded fixtures (<fixtures>/<id>.json, as written
+by availability_proxy.record) or synthesized when no fixture exists. Latency,
+error injection and the upstream range limit are configurable. Stdlib only, so
+it runs outside bench:
+
+    python -m cumbrian_dreams.benchmarks.ftb_standin --port 8765 --latency-ms 150 --error-5xx 0.05
+
+then point the site at it:
+
+    bench --site <site> set-config ftb_base_url http://127.0.0.1:8765
+
+GET /__stats returns request counters; POST /__reset clears them.
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# FreeToBook rejects availability ranges longer than this
+DEFAULT_MAX_RANGE_DAYS = 186
+COOKIE_NAME = "ftb_session"
+
+
+def synthetic_entries(start: date, days: int, seed=7) -> list[dict]:
+    """
+    A calendar shaped like the FreeToBook response (2 units, 3 pseudo units each,
+    roughly 30% of nights booked). Each day depends only on (seed, date), so any
+    window of the same property is consistent with any other.
+    """
+    entries = []
+    for i in range(days):
+        d = start + timedelta(days=i)
+        # bookings come in runs of a few nights
+        booked = random.Random(f"{seed}:{d.toordinal() // 4}").random() < 0.3
+        entries.append({
+            "date": d.isoformat(),
+            "isClosedToArrival": d.weekday() == 6,
+            "isClosedToDeparture": False,
+            "minimumStay": 2,
+            "unitAvailabilities": [
+                {
+                    "unitId": 1000 + u,
+                    "allocation": 0 if booked else 1,
+                    "rate": 120.0 + u * 15,
+                    "pseudoUnitAvailabilities": [
+                        {"pseudoUnitId": 5000 + u * 10 + p, "isBooked": booked}
+                        for p in range(3)
+                    ],
+                }
+                for u in range(2)
+            ],
+        })
+    return entries
+
+
+class StandinConfig:
+    def __init__(self, fixtures_dir=None, latency_ms=0, jitter_ms=0, error_403=0.0, error_5xx=0.0,
+                 error_non_json=0.0, require_cookie=False, max_range_days=DEFAULT_MAX_RANGE_DAYS, seed=None):
+        self.fixtures_dir = fixtures_dir
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_403 = error_403
+        self.error_5xx = error_5xx
+        self.error_non_json = error_non_json
+        self.require_cookie = require_cookie
+        self.max_range_days = max_range_days
+        self.rnd = random.Random(seed)
+        self._fixtures = {}
+        self._lock = threading.Lock()
+        self.stats = {}
+
+    def count(self, key: str):
+        with self._lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def roll(self, rate: float) -> bool:
+        with self._lock:
+            return rate > 0 and self.rnd.random() < rate
+
+    def delay(self) -> float:
+        with self._lock:
+            jitter = self.rnd.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def entries(self, property_id: str, start: date, end: date) -> list[dict]:
+        recorded = self._fixture(property_id)
+        if recorded is None:
+            return synthetic_entries(start, (end - start).days + 1, seed=property_id)
+        lo, hi = start.isoformat(), end.isoformat()
+        return [e for e in recorded if lo <= (e.get("date") or "") <= hi]
+
+    def _fixture(self, property_id: str):
+        if not self.fixtures_dir:
+            return None
+        with self._lock:
+            if property_id not in self._fixtures:
+                path = os.path.join(self.fixtures_dir, f"{property_id}.json")
+                data = None
+                if os.path.exists(path):
+                    with open(path) as f:
+                        data = json.load(f)
+                    if isinstance(data, dict):
+                        data = data.get("datedPropertyAvailabilities") or []
+                self._fixtures[property_id] = data
+            return self._fixtures[property_id]
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    config: StandinConfig = None
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real upstream
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/__stats":
+            return self._send(200, json.dumps(self.config.stats).encode())
+
+        parts = [p for p in url.path.split("/") if p]
+        if len(parts) < 3 or parts[:2] != ["booking-pages", "property"]:
+            return self._send(404, b'{"error":"not found"}')
+
+        property_id = parts[2]
+        time.sleep(self.config.delay())
+        if len(parts) == 3:
+            self.config.count("page")
+            return self._send(200, b"<html><body>property</body></html>", "text/html",
+                              {"Set-Cookie": f"{COOKIE_NAME}={property_id}-{time.time_ns()}; Path=/"})
+        if len(parts) == 4 and parts[3] == "availability":
+            return self._availability(property_id, parse_qs(url.query))
+        return self._send(404, b'{"error":"not found"}')
+
+    def do_POST(self):
+        if urlsplit(self.path).path == "/__reset":
+            self.config.stats.clear()
+            return self._send(200, b"{}")
+        return self._send(404, b'{"error":"not found"}')
+
+    def _availability(self, property_id: str, query: dict):
+        cfg = self.config
+        cfg.count("availability")
+        if cfg.require_cookie and COOKIE_NAME not in (self.headers.get("Cookie") or ""):
+            cfg.count("403")
+            return self._send(403, b'{"error":"forbidden"}')
+        if cfg.roll(cfg.error_403):
+            cfg.count("403")
+            return self._send(403, b'{"error":"forbidden"}')
+        if cfg.roll(cfg.error_5xx):
+            cfg.count("5xx")
+            return self._send(503, b'{"error":"unavailable"}')
+        if cfg.roll(cfg.error_non_json):
+            cfg.count("non_json")
+            return self._send(200, b"<html><body>Please wait...</body></html>", "text/html")
+
+        try:
+            start = date.fromisoformat(query["from_date"][0])
+            end = date.fromisoformat(query["to_date"][0])
+        except (KeyError, ValueError):
+            cfg.count("400")
+            return self._send(400, b'{"error":"from_date and to_date are required"}')
+        if end < start or (end - start).days + 1 > cfg.max_range_days:
+            cfg.count("400")
+            return self._send(400, b'{"error":"date range too long"}')
+
+        body = json.dumps({"datedPropertyAvailabilities": cfg.entries(property_id, start, end)})
+        return self._send(200, body.encode())
+
+    def _send(self, status: int, body: bytes, content_type="application/json", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(host="127.0.0.1", port=8765, **config) -> ThreadingHTTPServer:
+    """Start the stand-in on a daemon thread and return the server (call .shutdown() to stop)."""
+    handler = type("Handler", (StandinHandler,), {"config": StandinConfig(**config)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    p = argparse.ArgumentParser(description="FreeToBook stand-in for offline benchmarks")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--fixtures", dest="fixtures_dir", help="directory of recorded <property_id>.json")
+    p.add_argument("--latency-ms", type=float, default=0)
+    p.add_argument("--jitter-ms", type=float, default=0)
+    p.add_argument("--error-403", type=float, default=0.0, help="fraction of availability calls answered 403")
+    p.add_argument("--error-5xx", type=float, default=0.0, help="fraction answered 503")
+    p.add_argument("--error-non-json", type=float, default=0.0, help="fraction answered with an HTML page")
+    p.add_argument("--require-cookie", action="store_true", help="403 availability calls without a page cookie")
+    p.add_argument("--max-range-days", type=int, default=DEFAULT_MAX_RANGE_DAYS)
+    p.add_argument("--seed", type=int)
+    args = vars(p.parse_args())
+
+    host, port = args.pop("host"), args.pop("port")
+    server = serve(host, port, **args)
+    print(f"FreeToBook stand-in on http://{host}:{port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# apps/cumbrian_dreams/cumbrian_dreams/benchmarks/query_plans.py
+"""
+EXPLAIN regression check for the hot listing / booking queries (MariaDB).
+
+    bench --site <site> execute cumbrian_dreams.benchmarks.query_plans.run
+
+Each query is built the same way the endpoints build it (frappe.get_all with
+run=0, or the search builder with run=False). A check fails when the index
+it relies on is not among the plan's possible keys, or when the table is
+read with a full scan while holding at least `min_rows` rows (the optimizer
+rightly scans tiny tables). Failures raise AssertionError, so the command
+exits non-zero in CI; tests/test_query_plans.py runs the same checks.
+"""
+import json
+from datetime import timedelta
+
+import frappe
+from frappe.utils import getdate, nowdate
+
+from cumbrian_dreams.search import search_bookings, search_properties
+
+DEFAULT_MIN_ROWS = 1000
+
+
+def _sample(doctype: str, field: str, default: str) -> str:
+    return frappe.db.get_value(doctype, {field: ["is", "set"]}, field) or default
+
+
+def _checks() -> list[tuple[str, str, str, str]]:
+    """(label, sql, table, index the plan must be able to use)."""
+    prop = _sample("Booking", "property", "PROP-0001")
+    user = _sample("Booking", "user", "guest@example.com")
+    host = _sample("Property", "host", "host@example.com")
+    today = getdate(nowdate())
+    month = [today, today + timedelta(days=30)]
+
+    def get_all(doctype, **kwargs):
+        return frappe.get_all(doctype, run=0, **kwargs)
+
+    listing = search_properties(["name", "title"], stay=(today, today + timedelta(days=3)), run=False)
+    host_bookings = search_bookings(["name", "booking_date"], status="Active", host=host, limit=51, run=False)
+    return [
+        (
+            "booking availability probe",
+            get_all("Booking", filters={"property": prop, "status": "Active",
+                                        "booking_date": ["between", month]}, fields=["name"]),
+            "tabBooking", "property_status_booking_date_index",
+        ),
+        (
+            "host_bookings / list_bookings by host (join)",
+            str(host_bookings), "tabBooking", "property_status_booking_date_index",
+        ),
+        (
+            "host_bookings / list_bookings by host (join): host's properties",
+            str(host_bookings), "tabProperty", "host_modified_index",
+        ),
+        (
+            "a user's bookings",
+            get_all("Booking", filters={"user": user}, fields=["name", "booking_date"],
+                    order_by="booking_date desc", limit_page_length=21),
+            "tabBooking", "user_booking_date_index",
+        ),
+        (
+            "my_properties by host",
+            get_all("Property", filters={"host": host}, fields=["name", "modified"],
+                    order_by="modified desc", limit_page_length=500),
+            "tabProperty", "host_modified_index",
+        ),
+        (
+            "list_properties price range",
+            get_all("Property", filters=[["price_per_night", "between", [50, 150]]], fields=["name"]),
+            "tabProperty", "price_per_night_index",
+        ),
+        (
+            "date search: booking NOT EXISTS",
+            str(listing), "tabBooking", "property_status_booking_date_index",
+        ),
+        (
+            "date search: external availability NOT EXISTS",
+            str(listing), "tabExternal Availability", "property_date_index",
+        ),
+    ]
+
+
+def _table_rows(table: str) -> int:
+    return frappe.db.sql(f"SELECT COUNT(*) FROM `{table}`")[0][0]
+
+
+def check(min_rows: int = DEFAULT_MIN_ROWS) -> tuple[list[dict], list[str]]:
+    """(report row per query, failure messages) for _checks()."""
+    sizes, failures, report = {}, [], []
+    for label, sql, table, index in _checks():
+        plan = [r for r in frappe.db.sql(f"EXPLAIN {sql}", as_dict=True) if r.table == table]
+        if table not in sizes:
+            sizes[table] = _table_rows(table)
+
+        problems = []
+        if not plan:
+            problems.append(f"{table} not in plan")
+        for row in plan:
+            possible = (row.possible_keys or "").split(",")
+            if index not in possible:
+                problems.append(f"{index} not usable (possible_keys={row.possible_keys})")
+            if row.type == "ALL" and sizes[table] >= min_rows:
+                problems.append(f"full scan of {sizes[table]} rows")
+
+        report.append({
+            "query": label,
+            "table": table,
+            "type": [r.type for r in plan],
+            "key": [r.key for r in plan],
+            "ok": not problems,
+        })
+        if problems:
+            failures.append(f"{label}: {'; '.join(problems)}")
+    return report, failures
+
+
+def run(min_rows: int = DEFAULT_MIN_ROWS) -> dict:
+    if frappe.db.db_type != "mariadb":
+        print("query_plans: MariaDB only, skipped")
+        return {"skipped": True}
+
+    report, failures = check(min_rows)
+    print(json.dumps(report, indent=2, default=str))
+    if failures:
+        raise AssertionError("query plan regressions:\n  " + "\n  ".join(failures))
+    return {"checked": len(report), "failures": 0}
@@ -0,0 +1,156 @@
+import hashlib
+import json
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import cint, getdate, now_datetime
+
+from cumbrian_dreams.freetobook import entry_date, summarize_entry
+
+DOCTYPE = "External Availability"
+
+
+class ExternalAvailability(Document):
+    pass
+
+
+def on_doctype_update():
+    # one row per upstream property per day; also serves the range query
+    frappe.db.add_unique(DOCTYPE, ["external_property_id", "date"], constraint_name="unique_ext_property_date")
+    # property search probes by (property, date range)
+    frappe.db.add_index(DOCTYPE, ["property", "date"], index_name="property_date_index")
+
+
+def find_property(property_id) -> dict | None:
+    """Resolve the id used by the calendar (external id, or Property name) to a Property row."""
+    fields = ["name", "external_property_id", "availability_synced_at", "availability_synced_to"]
+    key = str(property_id).strip()
+    if key.isdigit():
+        return frappe.db.get_value("Property", {"external_property_id": cint(key)}, fields, as_dict=True)
+    return frappe.db.get_value("Property", key, fields, as_dict=True)
+
+
+def find_properties(property_ids) -> dict:
+    """find_property() for many ids in at most two queries, keyed by the id as given."""
+    fields = ["name", "external_property_id", "availability_synced_at", "availability_synced_to"]
+    keys = [str(p).strip() for p in property_ids]
+    ext_ids = [cint(k) for k in keys if k.isdigit()]
+    names = [k for k in keys if not k.isdigit()]
+
+    by_ext, by_name = {}, {}
+    if ext_ids:
+        for r in frappe.get_all("Property", filters=[["external_property_id", "in", ext_ids]], fields=fields):
+            by_ext[str(r.external_property_id)] = r
+    if names:
+        for r in frappe.get_all("Property", filters=[["name", "in", names]], fields=fields):
+            by_name[r.name] = r
+    return {k: (by_ext.get(str(cint(k))) if k.isdigit() else by_name.get(k)) for k in keys}
+
+
+def upsert_days(property_name: str, external_id, entries: list[dict], from_date=None, to_date=None) -> int:
+    """
+    Store upstream per-day entries for one property, writing only days whose
+    payload changed since the last sync. With from_date/to_date the entries are
+    the full picture for that window: stored days in it that upstream no longer
+    returns are deleted. Returns the number of rows written or deleted.
+    """
+    external_id = str(external_id)
+    lo = getdate(from_date).isoformat() if from_date else None
+    hi = getdate(to_date).isoformat() if to_date else None
+    dated = {}
+    for entry in entries:
+        d = entry_date(entry)
+        if d and (not lo or d >= lo) and (not hi or d <= hi):
+            dated[d] = entry
+    if not dated and not (lo and hi):
+        return 0
+
+    existing = {
+        str(r.date): (r.name, r.digest)
+        for r in frappe.get_all(
+            DOCTYPE,
+            filters={
+                "external_property_id": external_id,
+                "date": ["between", [lo or min(dated), hi or max(dated)]],
+            },
+            fields=["name", "date", "digest"],
+        )
+    }
+
+    now = now_datetime()
+    user = frappe.session.user
+    new_rows = []
+    written = 0
+    for d, entry in dated.items():
+        payload = json.dumps(entry, sort_keys=True, separators=(",", ":"))
+        digest = hashlib.sha1(payload.encode()).hexdigest()
+        found = existing.get(d)
+        if found and found[1] == digest:
+            continue
+
+        closed_arr, closed_dep, blocked = summarize_entry(entry)
+        values = {
+            "closed_to_arrival": int(closed_arr),
+            "closed_to_departure": int(closed_dep),
+            "stay_blocked": int(blocked),
+            "synced_at": now,
+            "digest": digest,
+            "payload": payload,
+        }
+        if found:
+            frappe.db.set_value(DOCTYPE, found[0], values)
+        else:
+            new_rows.append((
+                frappe.generate_hash(length=10), now, now, user, user,
+                property_name, external_id, getdate(d), *values.values(),
+            ))
+        written += 1
+
+    gone = [name for d, (name, _digest) in existing.items() if d not in dated] if lo and hi else []
+    if gone:
+        frappe.db.delete(DOCTYPE, {"name": ["in", gone]})
+        written += len(gone)
+
+    if new_rows:
+        frappe.db.bulk_insert(
+            DOCTYPE,
+            fields=[
+                "name", "creation", "modified", "owner", "modified_by",
+                "property", "external_property_id", "date",
+                "closed_to_arrival", "closed_to_departure", "stay_blocked",
+                "synced_at", "digest", "payload",
+            ],
+            values=new_rows,
+        )
+    return written
+
+
+def get_days(external_id, from_date, to_date, fields=("payload",)) -> list[dict]:
+    """Stored rows for [from_date, to_date], ordered by date (single indexed range query)."""
+    return frappe.get_all(
+        DOCTYPE,
+        filters={
+            "external_property_id": str(external_id),
+            "date": ["between", [getdate(from_date), getdate(to_date)]],
+        },
+        fields=["date", *fields],
+        order_by="date asc",
+    )
+
+
+def get_days_many(external_ids, from_date, to_date, fields=("payload",)) -> dict:
+    """get_days() for several properties in one query: {external_id: [rows]}."""
+    out = {str(e): [] for e in external_ids}
+    if not out:
+        return out
+    for r in frappe.get_all(
+        DOCTYPE,
+        filters={
+            "external_property_id": ["in", list(out)],
+            "date": ["between", [getdate(from_date), getdate(to_date)]],
+        },
+        fields=["external_property_id", "date", *fields],
+        order_by="date asc",
+    ):
+        out[r.external_property_id].append(r)
+    return out
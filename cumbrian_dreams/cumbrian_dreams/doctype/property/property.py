@@ -8,3 +8,21 @@ class Property(Document):
             exists = frappe.db.exists("Property", {"title": self.title, "name": ["!=", self.name]})
             if exists:
                 frappe.throw(f"Property with the name '{self.title}' already exists.")
+
+
+# hot filters (see benchmarks/query_plans.py)
+INDEXES = {
+    # my_properties / host_bookings / list_properties?host=, newest first
+    "host_modified_index": ["host", "modified"],
+    # min_price / max_price and order_by=price
+    "price_per_night_index": ["price_per_night"],
+}
+
+
+def on_doctype_update():
+    from cumbrian_dreams.search import ensure_fulltext_index
+
+    for index_name, fields in INDEXES.items():
+        frappe.db.add_index("Property", fields, index_name=index_name)
+    # free-text search over title / location / features (fresh installs; existing sites get it via patch)
+    ensure_fulltext_index()
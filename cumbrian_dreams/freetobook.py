@@ -0,0 +1,826 @@
+# apps/cumbrian_dreams/cumbrian_dreams/freetobook.py
+"""
+Upstream client for FreeToBook per-property availability.
+
+Availability is fetched in 180-day chunks aligned to a fixed epoch, so a given
+date always falls in the same chunk and the chunk cache key does not shift as
+"today" moves forward.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import date, timedelta
+from urllib.parse import quote
+
+import frappe
+import requests
+from frappe.utils import cint
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool, HTTPSConnectionPool
+
+from cumbrian_dreams.utils import single_flight, single_flight_many
+
+FTB_BASE_URL = "https://freetobook.com"  # override via site_config ftb_base_url (e.g. a local stand-in)
+CHUNK_DAYS = 180  # <=186 per FTB constraint
+CHUNK_EPOCH = date(2000, 1, 1)
+
+# cache defaults (seconds); override via site_config
+DEFAULT_CACHE_GRACE = 60 * 60
+
+# chunk TTL by how far ahead the chunk starts: [max_days_ahead, ttl_seconds],
+# last tier has no limit. Override with ftb_ttl_tiers, or ftb_cache_ttl for one flat TTL.
+DEFAULT_TTL_TIERS = [
+    [60, 15 * 60],        # next two months: changes constantly
+    [365, 6 * 3600],      # rest of the year
+    [None, 24 * 3600],    # 12+ months out: rarely changes
+]
+
+# parallel chunk requests per proxy call; override via site_config
+DEFAULT_MAX_CONCURRENCY = 3
+
+# per-worker connection pool and cookie warm-up; override via site_config
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_COOKIE_TTL = 30 * 60
+
+# latency budget and circuit breaker; override via site_config
+DEFAULT_TIME_BUDGET = 8               # seconds per proxy call, all chunks included
+DEFAULT_SLOW_CALL_MS = 5000           # slower calls count as failures
+DEFAULT_BREAKER_WINDOW = 60           # seconds of outcomes considered
+DEFAULT_BREAKER_MIN_CALLS = 5
+DEFAULT_BREAKER_FAILURE_RATE = 0.5
+DEFAULT_BREAKER_COOLDOWN = 30         # seconds open before a probe is let through
+DEFAULT_LKG_RETENTION = 7 * 24 * 3600  # keep last known good chunks this long
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Browser-like headers; Referer must be the property page
+UA = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+      "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36")
+
+
+class UpstreamNonJSON(Exception):
+    """Upstream answered 2xx but the body was not JSON."""
+
+    def __init__(self, body: str):
+        super().__init__("Upstream did not return JSON.")
+        self.body = body
+
+
+class BudgetExceeded(requests.Timeout):
+    """The per-call time budget ran out before this chunk was fetched."""
+
+
+class UpstreamUnavailable(Exception):
+    """No data to serve: the breaker is open or a shared fetch failed, and nothing is cached."""
+
+
+def _conf_int(key: str, default: int) -> int:
+    return cint(frappe.conf.get(key) or default)
+
+
+def base_url() -> str:
+    return (frappe.conf.get("ftb_base_url") or FTB_BASE_URL).rstrip("/")
+
+
+def property_url(property_id, base: str = FTB_BASE_URL) -> str:
+    return f"{base}/booking-pages/property/{quote(str(property_id))}"
+
+
+def page_headers() -> dict:
+    return {
+        "User-Agent": UA,
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        "Accept-Language": "en-GB,en;q=0.9",
+    }
+
+
+def api_headers(property_id, base: str = FTB_BASE_URL) -> dict:
+    return {
+        "User-Agent": UA,
+        "Accept": "application/json",
+        "Accept-Language": "en-GB,en;q=0.9",
+        "Origin": base,
+        "Referer": property_url(property_id, base),
+        "X-Requested-With": "XMLHttpRequest",
+    }
+
+
+def chunk_windows(start: date, end: date) -> list[tuple[date, date]]:
+    """Epoch-aligned (chunk_start, chunk_end) windows covering [start, end]."""
+    idx = (start - CHUNK_EPOCH).days // CHUNK_DAYS
+    windows = []
+    while True:
+        w_start = CHUNK_EPOCH + timedelta(days=idx * CHUNK_DAYS)
+        if w_start > end:
+            break
+        windows.append((w_start, w_start + timedelta(days=CHUNK_DAYS - 1)))
+        idx += 1
+    return windows
+
+
+def extract_entries(data) -> list[dict]:
+    """Pull the per-day list out of an upstream payload (camelCase or snake_case)."""
+    if isinstance(data, dict):
+        return (data.get("datedPropertyAvailabilities")
+                or data.get("dated_property_availabilities")
+                or [])
+    if isinstance(data, list):
+        return data
+    return []
+
+
+def entry_date(entry) -> str | None:
+    return entry.get("date") or entry.get("Date")
+
+
+def _coalesce(*values):
+    """First value that is not None (JS `??`)."""
+    return next((v for v in values if v is not None), None)
+
+
+def summarize_entry(entry) -> tuple[bool, bool, bool]:
+    """
+    (closed_to_arrival, closed_to_departure, stay_blocked) for one upstream day.
+    Same rules as the calendar in templates/pages/property.html: a night is
+    blocked when every unit has no allocation or all its pseudo units are booked.
+    """
+    closed_arr = _coalesce(entry.get("isClosedToArrival"), entry.get("is_closed_to_arrival")) is True
+    closed_dep = _coalesce(entry.get("isClosedToDeparture"), entry.get("is_closed_to_departure")) is True
+
+    units = entry.get("unitAvailabilities") or entry.get("unit_availabilities") or []
+
+    def _unit_unavailable(u):
+        alloc = cint(_coalesce(u.get("allocation"), u.get("available_allocation"), 0))
+        pseudos = u.get("pseudoUnitAvailabilities") or u.get("pseudo_unit_availabilities") or []
+        all_booked = bool(pseudos) and all(p.get("isBooked") or p.get("is_booked") for p in pseudos)
+        return alloc == 0 or all_booked
+
+    stay_blocked = bool(units) and all(_unit_unavailable(u) for u in units)
+    return closed_arr, closed_dep, stay_blocked
+
+
+def date_ranges(days) -> list[list[str]]:
+    """Run-length encode sorted ISO dates into inclusive [first, last] ranges."""
+    ranges = []
+    prev = None
+    for d in days:
+        cur = date.fromisoformat(d)
+        if prev is not None and cur == prev + timedelta(days=1):
+            ranges[-1][1] = d
+        else:
+            ranges.append([d, d])
+        prev = cur
+    return ranges
+
+
+def compact_flags(days) -> dict:
+    """
+    Reduce (iso_date, closed_to_arrival, closed_to_departure, stay_blocked)
+    rows, sorted by date, to date ranges for each flag.
+    """
+    closed_arr, closed_dep, blocked = [], [], []
+    for d, arr, dep, stay in days:
+        if arr:
+            closed_arr.append(d)
+        if dep:
+            closed_dep.append(d)
+        if stay:
+            blocked.append(d)
+    return {
+        "closedArr": date_ranges(closed_arr),
+        "closedDep": date_ranges(closed_dep),
+        "stayBlocked": date_ranges(blocked),
+    }
+
+
+def compact_entries(entries: list[dict]) -> dict:
+    """compact_flags() for raw upstream entries."""
+    return compact_flags(
+        (entry_date(e), *summarize_entry(e)) for e in entries if entry_date(e)
+    )
+
+
+# ---- pooled session ----
+#
+# One requests.Session per worker process, so TLS connections and cookies
+# survive across proxy calls. Connection counters are kept per worker and
+# flushed to Redis by publish_stats() from the request thread.
+
+_session = None
+_session_lock = threading.Lock()
+_warmed_until = {}  # property_id -> time.monotonic() deadline
+_stats = {"requests": 0, "new_connections": 0}
+_stats_lock = threading.Lock()
+_STAT_KEYS = tuple(_stats)
+
+
+def _count(key: str, n: int = 1) -> None:
+    with _stats_lock:
+        _stats[key] += n
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        _count("new_connections")
+        return super()._new_conn()
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        _count("new_connections")
+        return super()._new_conn()
+
+
+class _PooledAdapter(HTTPAdapter):
+    """HTTPAdapter that counts requests sent and connections opened."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+    def send(self, request, *args, **kwargs):
+        _count("requests")
+        return super().send(request, *args, **kwargs)
+
+
+def get_session() -> requests.Session:
+    """The worker's shared session (created on first use, keep-alive pooled)."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                maxsize = max(
+                    max_concurrency(),
+                    cint(frappe.conf.get("ftb_pool_maxsize") or DEFAULT_POOL_MAXSIZE),
+                )
+                adapter = _PooledAdapter(pool_connections=2, pool_maxsize=maxsize, max_retries=0)
+                sess = requests.Session()
+                sess.mount("https://", adapter)
+                sess.mount("http://", adapter)
+                _session = sess
+    return _session
+
+
+def cookie_ttl() -> int:
+    return cint(frappe.conf.get("ftb_cookie_ttl") or DEFAULT_COOKIE_TTL)
+
+
+def warm_session(sess: requests.Session, property_id, ttl: int | None = None, force: bool = False,
+                 deadline: float | None = None, base: str | None = None) -> None:
+    """
+    Fetch the property page so upstream sets its cookies (non-fatal if it fails).
+    Skipped while a previous warm-up for this property is younger than `ttl`.
+    From worker threads pass `ttl` and `base` explicitly (no frappe.conf there).
+    """
+    base = base or base_url()
+    key = f"{base}|{property_id}"
+    now = time.monotonic()
+    if not force and _warmed_until.get(key, 0) > now:
+        return
+    try:
+        sess.get(property_url(property_id, base), headers=page_headers(),
+                 timeout=_timeout(deadline, 12), allow_redirects=True)
+    except requests.RequestException:
+        return
+    _warmed_until[key] = now + (cookie_ttl() if ttl is None else ttl)
+
+
+def connection_stats() -> dict:
+    """This worker's counters since start: requests sent, connections opened and reused."""
+    with _stats_lock:
+        snap = dict(_stats)
+    snap["reused_connections"] = max(0, snap["requests"] - snap["new_connections"])
+    snap["pid"] = os.getpid()
+    return snap
+
+
+_published = dict.fromkeys(_STAT_KEYS, 0)
+
+
+def publish_stats() -> None:
+    """Add this worker's counter deltas to the site-wide totals in Redis."""
+    with _stats_lock:
+        deltas = {k: _stats[k] - _published[k] for k in _STAT_KEYS}
+        _published.update(_stats)
+    cache = frappe.cache()
+    for k, n in deltas.items():
+        if n:
+            cache.incrby(cache.make_key(f"ftb:stats:{k}"), n)
+
+
+def site_connection_stats() -> dict:
+    """Totals across all workers, as published by publish_stats()."""
+    cache = frappe.cache()
+    out = {k: cint(cache.get(cache.make_key(f"ftb:stats:{k}"))) for k in _STAT_KEYS}
+    out["reused_connections"] = max(0, out["requests"] - out["new_connections"])
+    return out
+
+
+# ---- upstream calls ----
+
+def time_budget() -> int:
+    return _conf_int("ftb_time_budget", DEFAULT_TIME_BUDGET)
+
+
+def flight_wait() -> float:
+    """How long a single_flight waiter waits for the leader: its fetch budget plus time to cache the chunks."""
+    return time_budget() + 2.0
+
+
+def _timeout(deadline: float | None, cap: float) -> float:
+    """Per-request timeout: `cap`, shortened to what is left of the budget."""
+    if deadline is None:
+        return cap
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise BudgetExceeded("Upstream time budget exhausted.")
+    return min(cap, left)
+
+
+def fetch_chunk(sess: requests.Session, property_id, chunk_start: date, chunk_end: date,
+                warm_ttl: int = DEFAULT_COOKIE_TTL, deadline: float | None = None,
+                base: str = FTB_BASE_URL) -> list[dict]:
+    """
+    One upstream availability call. Raises requests exceptions on HTTP/network
+    failure (BudgetExceeded once `deadline` has passed) and UpstreamNonJSON when
+    the body can't be decoded.
+    Safe to call from worker threads: warm_ttl and base are passed in rather than read from conf.
+    """
+    avail_url = f"{property_url(property_id, base)}/availability"
+    headers = api_headers(property_id, base)
+    # windows are epoch-aligned (stable cache keys) but upstream is never asked for past days
+    today = date.today()
+    params = {
+        "from_date": (chunk_start if chunk_end < today else max(chunk_start, today)).strftime("%Y-%m-%d"),
+        "to_date":   chunk_end.strftime("%Y-%m-%d"),
+    }
+
+    r = sess.get(avail_url, params=params, headers=headers,
+                 timeout=_timeout(deadline, 15), allow_redirects=True)
+    if r.status_code == 403:
+        # cookies are probably stale: re-warm, then retry without
+        # X-Requested-With (some stacks dislike it)
+        warm_session(sess, property_id, ttl=warm_ttl, force=True, deadline=deadline, base=base)
+        hdr_retry = dict(headers)
+        hdr_retry.pop("X-Requested-With", None)
+        r = sess.get(avail_url, params=params, headers=hdr_retry,
+                     timeout=_timeout(deadline, 15), allow_redirects=True)
+
+    r.raise_for_status()
+    try:
+        data = r.json()
+    except ValueError:
+        raise UpstreamNonJSON(r.text[:800])
+    return extract_entries(data)
+
+
+def max_concurrency() -> int:
+    return max(1, cint(frappe.conf.get("ftb_max_concurrency") or DEFAULT_MAX_CONCURRENCY))
+
+
+def fetch_jobs(sess: requests.Session, jobs, concurrency: int, deadline: float | None = None) -> list:
+    """
+    Fetch chunks for one or more properties on one session, at most
+    `concurrency` at a time. `jobs` is [(property_id, (chunk_start, chunk_end)), ...].
+
+    Returns [(job, entries_or_exception, elapsed_ms), ...] in the order of
+    `jobs`. Jobs still queued or running when `deadline` passes are abandoned
+    with BudgetExceeded (elapsed_ms None).
+    Worker threads only touch the session: no frappe.local is available there.
+    """
+    ttl = cookie_ttl()
+    base = base_url()
+
+    def _one(job):
+        property_id, (w_start, w_end) = job
+        t0 = time.monotonic()
+        try:
+            # no-op while cookies are fresh
+            warm_session(sess, property_id, ttl=ttl, deadline=deadline, base=base)
+            result = fetch_chunk(sess, property_id, w_start, w_end, warm_ttl=ttl, deadline=deadline, base=base)
+        except Exception as e:
+            result = e
+        return job, result, (time.monotonic() - t0) * 1000
+
+    if len(jobs) <= 1 or concurrency <= 1:
+        return [_one(j) for j in jobs]
+
+    pool = ThreadPoolExecutor(max_workers=min(concurrency, len(jobs)))
+    futures = [pool.submit(_one, j) for j in jobs]
+    wait(futures, timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+    # in-flight requests end on their own (their timeout is capped by the budget)
+    pool.shutdown(wait=False, cancel_futures=True)
+
+    out = []
+    for job, fut in zip(jobs, futures, strict=True):
+        if fut.done() and not fut.cancelled():
+            out.append(fut.result())
+        else:
+            out.append((job, BudgetExceeded("Upstream time budget exhausted."), None))
+    return out
+
+
+def fetch_chunks(sess: requests.Session, property_id, windows, concurrency: int,
+                 deadline: float | None = None) -> list:
+    """fetch_jobs() for one property: returns [(window, entries_or_exception, elapsed_ms), ...]."""
+    results = fetch_jobs(sess, [(property_id, w) for w in windows], concurrency, deadline)
+    return [(window, result, elapsed) for (_, window), result, elapsed in results]
+
+
+# ---- circuit breaker and latency histogram ----
+#
+# Shared across workers through Redis. Outcomes are recorded from the request
+# thread after a fan-out. When the failure rate in the last window is too high
+# the breaker opens for a cooldown; after that one probe call is let through
+# (half-open) and its outcome closes or re-opens the breaker.
+
+def _bkey(name: str) -> str:
+    return frappe.cache().make_key(f"ftb:breaker:{name}")
+
+
+def _lkey(name: str) -> str:
+    return frappe.cache().make_key(f"ftb:latency:{name}")
+
+
+def _is_upstream_failure(result) -> bool:
+    if not isinstance(result, Exception):
+        return False
+    if isinstance(result, requests.HTTPError):
+        status = getattr(result.response, "status_code", 0) or 0
+        return status >= 500 or status in (403, 429)
+    return True
+
+
+def breaker_allows() -> bool:
+    """True if an upstream call may be made now."""
+    cache = frappe.cache()
+    if cache.get(_bkey("open")) is not None:
+        return False
+    if cache.get(_bkey("tripped")) is not None:
+        # half-open: one probe per cooldown
+        cooldown = _conf_int("ftb_breaker_cooldown", DEFAULT_BREAKER_COOLDOWN)
+        return bool(cache.set(_bkey("probe"), 1, nx=True, ex=cooldown))
+    return True
+
+
+def _window_buckets(window: int) -> tuple[int, int]:
+    cur = int(time.time() // window)
+    return cur, cur - 1
+
+
+def _trip(cache) -> None:
+    cooldown = _conf_int("ftb_breaker_cooldown", DEFAULT_BREAKER_COOLDOWN)
+    cache.set(_bkey("open"), 1, ex=cooldown)
+    cache.set(_bkey("tripped"), 1, ex=cooldown * 20)
+    cache.delete(_bkey("probe"))
+
+
+def record_outcomes(results) -> None:
+    """Feed fetch_chunks() results into the breaker and the latency histogram."""
+    if not results:
+        return
+    cache = frappe.cache()
+    slow_ms = _conf_int("ftb_slow_call_ms", DEFAULT_SLOW_CALL_MS)
+    window = _conf_int("ftb_breaker_window", DEFAULT_BREAKER_WINDOW)
+
+    failures = 0
+    for _, result, elapsed_ms in results:
+        if elapsed_ms is not None:
+            label = next((str(b) for b in LATENCY_BUCKETS_MS if elapsed_ms <= b), "inf")
+            cache.incr(_lkey(f"le_{label}"))
+            cache.incr(_lkey("count"))
+            cache.incrbyfloat(_lkey("sum_ms"), round(elapsed_ms, 1))
+        if _is_upstream_failure(result) or (elapsed_ms or 0) > slow_ms:
+            failures += 1
+
+    cur, prev = _window_buckets(window)
+    calls_key, fail_key = _bkey(f"calls:{cur}"), _bkey(f"fail:{cur}")
+    cache.incrby(calls_key, len(results))
+    cache.expire(calls_key, window * 2)
+    if failures:
+        cache.incrby(fail_key, failures)
+        cache.expire(fail_key, window * 2)
+
+    if cache.get(_bkey("tripped")) is not None:
+        if failures:
+            _trip(cache)
+        else:
+            # probe succeeded: close and forget the failures that opened it
+            cache.delete(_bkey("tripped"), _bkey("probe"),
+                         calls_key, fail_key, _bkey(f"calls:{prev}"), _bkey(f"fail:{prev}"))
+        return
+
+    calls = cint(cache.get(calls_key)) + cint(cache.get(_bkey(f"calls:{prev}")))
+    fails = cint(cache.get(fail_key)) + cint(cache.get(_bkey(f"fail:{prev}")))
+    min_calls = _conf_int("ftb_breaker_min_calls", DEFAULT_BREAKER_MIN_CALLS)
+    rate = float(frappe.conf.get("ftb_breaker_failure_rate") or DEFAULT_BREAKER_FAILURE_RATE)
+    if calls >= min_calls and fails / calls >= rate:
+        _trip(cache)
+
+
+def breaker_state() -> dict:
+    cache = frappe.cache()
+    window = _conf_int("ftb_breaker_window", DEFAULT_BREAKER_WINDOW)
+    cur, prev = _window_buckets(window)
+    if cache.get(_bkey("open")) is not None:
+        state = "open"
+    elif cache.get(_bkey("tripped")) is not None:
+        state = "half_open"
+    else:
+        state = "closed"
+    return {
+        "state": state,
+        "window_seconds": window,
+        "calls": cint(cache.get(_bkey(f"calls:{cur}"))) + cint(cache.get(_bkey(f"calls:{prev}"))),
+        "failures": cint(cache.get(_bkey(f"fail:{cur}"))) + cint(cache.get(_bkey(f"fail:{prev}"))),
+    }
+
+
+def latency_histogram() -> dict:
+    """Upstream call latency since the counters were created (bucket -> count)."""
+    cache = frappe.cache()
+    labels = [str(b) for b in LATENCY_BUCKETS_MS] + ["inf"]
+    count = cint(cache.get(_lkey("count")))
+    total = float(cache.get(_lkey("sum_ms")) or 0)
+    return {
+        "buckets_ms": {f"le_{label}": cint(cache.get(_lkey(f"le_{label}"))) for label in labels},
+        "count": count,
+        "avg_ms": round(total / count, 1) if count else None,
+    }
+
+
+# ---- chunk cache ----
+
+def ttl_tiers() -> list:
+    if frappe.conf.get("ftb_ttl_tiers"):
+        return frappe.conf.get("ftb_ttl_tiers")
+    if frappe.conf.get("ftb_cache_ttl"):
+        return [[None, cint(frappe.conf.get("ftb_cache_ttl"))]]
+    return DEFAULT_TTL_TIERS
+
+
+def chunk_ttl(chunk_start: date, today: date | None = None, tiers: list | None = None) -> int:
+    """TTL for a chunk: short for the near term, long for far-future chunks."""
+    days_ahead = (chunk_start - (today or date.today())).days
+    tiers = tiers or ttl_tiers()
+    for max_days, ttl in tiers:
+        if max_days is None or days_ahead <= cint(max_days):
+            return cint(ttl)
+    return cint(tiers[-1][1])
+
+
+def cache_grace() -> int:
+    return cint(frappe.conf.get("ftb_cache_grace") or DEFAULT_CACHE_GRACE)
+
+
+def _chunk_key(property_id, chunk_start: date) -> str:
+    return f"ftb:avail:{property_id}:{chunk_start.isoformat()}"
+
+
+def get_cached_chunk(property_id, chunk_start: date) -> dict | None:
+    """Cached {"fetched_at": epoch_seconds, "entries": [...]} or None."""
+    # expires=True skips frappe.local's per-request copy, so a chunk another
+    # worker just stored is visible on re-read
+    return frappe.cache().get_value(_chunk_key(property_id, chunk_start), expires=True)
+
+
+def set_cached_chunk(property_id, chunk_start: date, entries: list[dict]) -> None:
+    # kept past ttl + grace as the last known good copy for when upstream is down
+    retention = max(chunk_ttl(chunk_start) + cache_grace(), _conf_int("ftb_lkg_retention", DEFAULT_LKG_RETENTION))
+    frappe.cache().set_value(
+        _chunk_key(property_id, chunk_start),
+        {"fetched_at": time.time(), "entries": entries},
+        expires_in_sec=retention,
+    )
+
+
+def refresh_chunk(property_id, chunk_start: str):
+    """Background job: re-pull one chunk and store it. Errors are logged, not raised."""
+    w_start = date.fromisoformat(chunk_start)
+    w_end = w_start + timedelta(days=CHUNK_DAYS - 1)
+    if not breaker_allows():
+        return
+    sess = get_session()
+    warm_session(sess, property_id)
+    results = fetch_chunks(sess, property_id, [(w_start, w_end)], 1)
+    publish_stats()
+    record_outcomes(results)
+
+    entries = results[0][1]
+    if isinstance(entries, Exception):
+        frappe.log_error(f"FTB refresh {property_id} {chunk_start}: {entries}", "ftb refresh_chunk")
+        return
+    set_cached_chunk(property_id, w_start, entries)
+
+
+def _enqueue_refresh(property_id, chunk_start: date) -> None:
+    frappe.enqueue(
+        "cumbrian_dreams.freetobook.refresh_chunk",
+        queue="short",
+        job_id=f"ftb-refresh:{property_id}:{chunk_start.isoformat()}",
+        deduplicate=True,
+        property_id=property_id,
+        chunk_start=chunk_start.isoformat(),
+    )
+
+
+def _fetch_missing(property_id, windows, errors: list) -> dict:
+    """
+    Fetch and cache `windows` upstream within the time budget.
+    Returns {chunk_start_iso: entries} for the chunks that succeeded; the
+    exceptions of the others are appended to `errors`.
+    """
+    deadline = time.monotonic() + time_budget()
+    sess = get_session()
+    warm_session(sess, property_id, deadline=deadline)
+    results = fetch_chunks(sess, property_id, windows, max_concurrency(), deadline=deadline)
+    publish_stats()
+    record_outcomes(results)
+
+    fetched = {}
+    for (w_start, _), result, _ in results:
+        if isinstance(result, Exception):
+            errors.append(result)
+            continue
+        set_cached_chunk(property_id, w_start, result)
+        fetched[w_start.isoformat()] = result
+    return fetched
+
+
+def _flight_key(property_id, windows) -> str:
+    # concurrent identical lookups (any worker, either entry point) share one upstream fetch
+    return f"ftb:{property_id}:" + ",".join(w.isoformat() for w, _ in windows)
+
+
+def _plan(property_id, start: date, end: date, allow_stale: bool, today: date, tiers, grace: int) -> dict:
+    """Split [start, end] into cached entries and chunks that must be (re)fetched."""
+    now = time.time()
+    plan = {"merged": {}, "missing": [], "stale": [], "last_good": {}}
+
+    for w_start, w_end in chunk_windows(start, end):
+        cached = get_cached_chunk(property_id, w_start)
+        if not cached:
+            plan["missing"].append((w_start, w_end))
+            continue
+        age = now - cached["fetched_at"]
+        ttl = chunk_ttl(w_start, today, tiers)
+        if age >= ttl + grace or (age >= ttl and not allow_stale):
+            plan["missing"].append((w_start, w_end))
+            plan["last_good"][w_start] = cached["entries"]  # expired copy
+            continue
+        if age >= ttl:
+            plan["stale"].append(w_start)
+        _merge_entries(plan["merged"], cached["entries"])
+    return plan
+
+
+def _merge_entries(merged_by_date: dict, entries) -> None:
+    for entry in entries:
+        d = entry_date(entry)
+        if d:
+            merged_by_date[d] = entry  # last one wins if dup
+
+
+def _assemble(property_id, plan: dict, fetched: dict, errors: list, meta: dict,
+              start: date, end: date) -> list[dict]:
+    """Merge fetched / last known good chunks into the plan and return the sorted range."""
+    merged_by_date = plan["merged"]
+    for w_start, _ in plan["missing"]:
+        entries = fetched.get(w_start.isoformat())
+        if entries is None:
+            entries = plan["last_good"].get(w_start)
+            if entries is None:
+                raise errors[0] if errors else UpstreamUnavailable("Availability is temporarily unavailable.")
+            meta["degraded"] = True
+        _merge_entries(merged_by_date, entries)
+
+    for w_start in plan["stale"]:
+        _enqueue_refresh(property_id, w_start)
+
+    lo, hi = start.isoformat(), end.isoformat()
+    return [merged_by_date[d] for d in sorted(merged_by_date) if lo <= d <= hi]
+
+
+def get_availability(property_id, start: date, end: date, allow_stale: bool = True,
+                     meta: dict | None = None) -> list[dict]:
+    """
+    Sorted per-day entries for [start, end], served from the chunk cache.
+
+    ttl is per chunk (chunk_ttl): near-term chunks expire quickly, far-future
+    ones rarely, so a refresh usually re-pulls only the near-term chunk.
+
+    - fresh chunk (age < ttl)         : served from cache
+    - stale chunk (age < ttl + grace) : served from cache, refreshed in background
+                                        (fetched inline when allow_stale is False)
+    - missing / expired chunk         : fetched upstream before returning,
+                                        in parallel (ftb_max_concurrency),
+                                        single-flighted across workers and
+                                        bounded by ftb_time_budget
+    - upstream failing / breaker open : expired chunks are served as last known
+                                        good and meta["degraded"] is set
+
+    meta["fetched"] lists the chunk starts (ISO) re-pulled by this call.
+
+    Raises the upstream error (or UpstreamUnavailable) when a chunk has neither
+    fresh data nor a last known good copy.
+    """
+    meta = {} if meta is None else meta
+    plan = _plan(property_id, start, end, allow_stale, date.today(), ttl_tiers(), cache_grace())
+    missing = plan["missing"]
+
+    fetched, errors = {}, []
+    if missing:
+        if breaker_allows():
+            fetched = single_flight(_flight_key(property_id, missing),
+                                    lambda: _fetch_missing(property_id, missing, errors),
+                                    wait=flight_wait())
+        else:
+            meta["breaker_open"] = True
+        meta["fetched"] = sorted(fetched)
+
+    return _assemble(property_id, plan, fetched, errors, meta, start, end)
+
+
+def get_availability_many(property_ids, start: date, end: date, meta: dict | None = None) -> dict:
+    """
+    get_availability() for several properties at once: cached chunks are
+    served as usual and every missing chunk, across all properties, is fetched
+    in one bounded fan-out sharing the time budget. Each property's misses are
+    single-flighted under the same key get_availability() uses, so concurrent
+    grids (and detail pages) wait for one fetch instead of repeating it.
+
+    Returns {property_id: entries or the exception for that property};
+    meta[property_id] gets the per-property flags ("degraded").
+    """
+    meta = {} if meta is None else meta
+    today, tiers, grace = date.today(), ttl_tiers(), cache_grace()
+    plans = {pid: _plan(pid, start, end, True, today, tiers, grace) for pid in property_ids}
+
+    fetched = {pid: {} for pid in plans}
+    errors = {pid: [] for pid in plans}
+    flights = {_flight_key(pid, plan["missing"]): pid for pid, plan in plans.items() if plan["missing"]}
+
+    def _fetch(keys) -> dict:
+        # one fan-out for every property this caller leads
+        jobs = [(flights[k], w) for k in keys for w in plans[flights[k]]["missing"]]
+        results = fetch_jobs(get_session(), jobs, max_concurrency(), deadline=time.monotonic() + time_budget())
+        publish_stats()
+        record_outcomes(results)
+        done = {k: {} for k in keys}
+        by_pid = {flights[k]: done[k] for k in keys}
+        for (pid, (w_start, _)), result, _ in results:
+            if isinstance(result, Exception):
+                errors[pid].append(result)
+                continue
+            set_cached_chunk(pid, w_start, result)
+            by_pid[pid][w_start.isoformat()] = result
+        return done
+
+    if flights:
+        if breaker_allows():
+            for key, value in single_flight_many(list(flights), _fetch, wait=flight_wait()).items():
+                fetched[flights[key]] = value
+        else:
+            meta["breaker_open"] = True
+
+    out = {}
+    for pid, plan in plans.items():
+        pid_meta = meta.setdefault(pid, {})
+        try:
+            out[pid] = _assemble(pid, plan, fetched[pid], errors[pid], pid_meta, start, end)
+        except Exception as e:
+            out[pid] = e
+    return out
+
+
+def days_cover(days, check_in: str, check_out: str) -> bool:
+    """Whether `days` has an entry for every date stay_available() looks at (check_in..check_out)."""
+    cur, last = date.fromisoformat(check_in), date.fromisoformat(check_out)
+    while cur <= last:
+        if cur.isoformat() not in days:
+            return False
+        cur += timedelta(days=1)
+    return True
+
+
+def stay_available(days, check_in: str, check_out: str) -> bool:
+    """
+    Whether a stay from check_in to check_out (ISO dates, check_out exclusive
+    for nights) is open, given {iso_date: (closed_arr, closed_dep, stay_blocked)}.
+    Missing dates count as open; check days_cover() first.
+    """
+    if check_in >= check_out:
+        return False
+    if days.get(check_in, (False, False, False))[0]:
+        return False
+    if days.get(check_out, (False, False, False))[1]:
+        return False
+    cur, last = date.fromisoformat(check_in), date.fromisoformat(check_out)
+    while cur < last:
+        if days.get(cur.isoformat(), (False, False, False))[2]:
+            return False
+        cur += timedelta(days=1)
+    return True
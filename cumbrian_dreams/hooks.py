@@ -91,6 +91,9 @@ web_include_css = ["/assets/cumbrian_dreams/css/overrides.css"]
 # before_install = "cumbrian_dreams.install.before_install"
 # after_install = "cumbrian_dreams.install.after_install"
 
+# static image manifest for the listing / property pages
+after_migrate = ["cumbrian_dreams.images.after_migrate"]
+
 # Uninstallation
 # ------------
 
@@ -164,6 +167,40 @@ web_include_css = ["/assets/cumbrian_dreams/css/overrides.css"]
 # 	],
 # }
 
+doc_events = {
+	"Property": {
+		"on_update": [
+			"cumbrian_dreams.search.bump_listing_generation",
+			"cumbrian_dreams.auth.invalidate_host_properties",
+		],
+		"on_trash": [
+			"cumbrian_dreams.search.bump_listing_generation",
+			"cumbrian_dreams.auth.invalidate_host_properties",
+			"cumbrian_dreams.availability.on_property_removed",
+		],
+		"after_rename": [
+			"cumbrian_dreams.auth.invalidate_host_properties",
+			"cumbrian_dreams.availability.on_property_removed",
+		],
+	},
+	"Booking": {
+		"on_update": [
+			"cumbrian_dreams.search.bump_availability_generation",
+			"cumbrian_dreams.availability.on_booking_change",
+		],
+		"on_trash": [
+			"cumbrian_dreams.search.bump_availability_generation",
+			"cumbrian_dreams.availability.on_booking_change",
+		],
+	},
+}
+
+scheduler_events = {
+	"hourly": [
+		"cumbrian_dreams.tasks.sync_external_availability"
+	],
+}
+
 # Testing
 # -------
 
@@ -0,0 +1,276 @@
+# apps/cumbrian_dreams/cumbrian_dreams/images.py
+"""
+Manifest of static property images under public/img/properties/<id>/.
+
+Built at migrate time (after_migrate hook) and written next to the images
+as manifest.json. Each worker loads it once. It re-stats the property
+directories at most every MANIFEST_CHECK_INTERVAL seconds and rescans only
+those whose mtime changed. Pages resolve a card cover or a gallery with a
+dict lookup instead of probing the filesystem.
+
+Resized derivatives (WebP plus a JPEG fallback at several widths) live in
+<id>/_derived/ and are listed in the manifest, so templates can emit
+srcset/sizes. They are generated offline with Pillow, incrementally, on
+migrate or by hand:
+
+    bench --site <site> execute cumbrian_dreams.images.generate_derivatives
+    bench --site <site> execute cumbrian_dreams.images.build_manifest
+"""
+import importlib.util
+import json
+import os
+import re
+import threading
+import time
+
+import frappe
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".webp", ".avif", ".gif")
+# card cover preference, then alphabetical
+COVER_STEMS = ("cover", "01", "1", "main", "hero")
+ASSET_URL = "/assets/cumbrian_dreams/img/properties"
+MANIFEST_NAME = "manifest.json"
+MANIFEST_CHECK_INTERVAL = 60
+
+DERIVED_DIR = "_derived"
+# card thumbnails on phones/desktops up to the hero on wide screens
+DERIVED_WIDTHS = (320, 640, 960, 1280, 1920)
+WEBP_QUALITY = 72
+JPEG_QUALITY = 78
+# src for browsers without srcset support
+FALLBACK_WIDTH = 960
+_DERIVED_RE = re.compile(r"^(?P<stem>.+)-(?P<w>\d+)w\.(?P<fmt>webp|jpg)$")
+
+_manifest = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def images_root() -> str:
+    return frappe.get_app_path("cumbrian_dreams", "public", "img", "properties")
+
+
+def _natkey(s):
+    # natural sort: 01.jpg, 2.jpg, 10.jpg
+    return [int(t) if t.isdigit() else t.lower() for t in re.split(r"(\d+)", s)]
+
+
+def _derived_name(filename: str, width: int, fmt: str) -> str:
+    return f"{os.path.splitext(filename)[0]}-{width}w.{fmt}"
+
+
+def _scan_derived(path: str, base: str, files: list[str]) -> dict:
+    """{source url: {"webp": [[w, url], ...], "jpg": [...]}} from <path>/_derived."""
+    derived_dir = os.path.join(path, DERIVED_DIR)
+    if not os.path.isdir(derived_dir):
+        return {}
+    by_stem = {os.path.splitext(f)[0]: f for f in files}
+    variants = {}
+    for name in os.listdir(derived_dir):
+        m = _DERIVED_RE.match(name)
+        if not m or m["stem"] not in by_stem:
+            continue
+        source = f"{base}/{by_stem[m['stem']]}"
+        url = f"{base}/{DERIVED_DIR}/{name}"
+        variants.setdefault(source, {}).setdefault(m["fmt"], []).append([int(m["w"]), url])
+    for formats in variants.values():
+        for widths in formats.values():
+            widths.sort()
+    return variants
+
+
+def _dir_mtime(path: str) -> float:
+    # writing derivatives touches _derived/, not the property folder itself
+    derived_dir = os.path.join(path, DERIVED_DIR)
+    mtime = os.stat(path).st_mtime
+    if os.path.isdir(derived_dir):
+        mtime = max(mtime, os.stat(derived_dir).st_mtime)
+    return mtime
+
+
+def scan_dir(root: str, prop_id: str) -> dict:
+    """Cover, natural-ordered gallery, derivatives and mtime for one property directory."""
+    path = os.path.join(root, prop_id)
+    files = [f for f in os.listdir(path) if f.lower().endswith(IMAGE_EXTS)
+             and os.path.isfile(os.path.join(path, f))]
+    present = set(files)
+
+    cover = next(
+        (f"{stem}{ext}" for stem in COVER_STEMS for ext in IMAGE_EXTS if f"{stem}{ext}" in present),
+        None,
+    )
+    if cover is None and files:
+        cover = sorted(files, key=str.lower)[0]
+
+    base = f"{ASSET_URL}/{prop_id}"
+    return {
+        "mtime": _dir_mtime(path),
+        "cover": f"{base}/{cover}" if cover else None,
+        "gallery": [f"{base}/{f}" for f in sorted(files, key=_natkey)],
+        "variants": _scan_derived(path, base, files),
+    }
+
+
+def _property_dirs(root: str) -> list[str]:
+    if not os.path.isdir(root):
+        return []
+    return [d for d in os.listdir(root) if os.path.isdir(os.path.join(root, d))]
+
+
+def _write(root: str, manifest: dict):
+    path = os.path.join(root, MANIFEST_NAME)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)  # atomic: other workers never read a partial file
+
+
+def build_manifest() -> dict:
+    """Scan every property directory and write manifest.json (after_migrate)."""
+    global _manifest, _checked_at
+    root = images_root()
+    manifest = {d: scan_dir(root, d) for d in _property_dirs(root)}
+    if os.path.isdir(root):
+        try:
+            _write(root, manifest)
+        except OSError:
+            # read-only checkout: workers rescan on first use (see get_manifest)
+            frappe.log_error(f"Cannot write {MANIFEST_NAME}", "build_manifest")
+    with _lock:
+        _manifest, _checked_at = manifest, time.monotonic()
+    return manifest
+
+
+def _refresh(root: str, manifest: dict) -> dict:
+    """Rescan directories that were added, removed or changed since the manifest was written."""
+    dirs = set(_property_dirs(root))
+    changed = False
+    fresh = {}
+    for d in dirs:
+        entry = manifest.get(d)
+        if entry is None or entry.get("mtime") != _dir_mtime(os.path.join(root, d)):
+            entry = scan_dir(root, d)
+            changed = True
+        fresh[d] = entry
+    if changed or len(fresh) != len(manifest):
+        try:
+            _write(root, fresh)
+        except OSError:
+            pass  # read-only checkout: still serve the fresh scan from memory
+    return fresh
+
+
+def get_manifest() -> dict:
+    """This worker's manifest: loaded once, re-validated against directory mtimes periodically."""
+    global _manifest, _checked_at
+    now = time.monotonic()
+    if _manifest is not None and now - _checked_at < MANIFEST_CHECK_INTERVAL:
+        return _manifest
+
+    with _lock:
+        if _manifest is not None and now - _checked_at < MANIFEST_CHECK_INTERVAL:
+            return _manifest
+        root = images_root()
+        manifest = _manifest
+        if manifest is None:
+            try:
+                with open(os.path.join(root, MANIFEST_NAME)) as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                manifest = {}
+        try:
+            manifest = _refresh(root, manifest)
+        except OSError:
+            pass  # a directory vanished mid-scan: keep what we have, retry next interval
+        _manifest, _checked_at = manifest, now
+        return _manifest
+
+
+def property_images(prop_id) -> dict | None:
+    """{"cover": url | None, "gallery": [url, ...]} for a property id, or None if it has no folder."""
+    return get_manifest().get(str(prop_id).strip())
+
+
+def responsive(prop_id, url: str | None) -> dict | None:
+    """
+    {"src", "srcset_webp", "srcset_jpg"} for an image in the manifest, or None
+    when it has no derivatives (templates then fall back to the plain src).
+    """
+    images = property_images(prop_id)
+    formats = (images or {}).get("variants", {}).get(url)
+    if not formats or not formats.get("jpg"):
+        return None
+    jpgs = formats["jpg"]
+    src = next((u for w, u in jpgs if w >= FALLBACK_WIDTH), jpgs[-1][1])
+    return {
+        "src": src,
+        "srcset_webp": ", ".join(f"{u} {w}w" for w, u in formats.get("webp", [])),
+        "srcset_jpg": ", ".join(f"{u} {w}w" for w, u in jpgs),
+    }
+
+
+def _derive_one(source: str, out_dir: str, force: bool) -> int:
+    from PIL import Image, ImageOps
+
+    written = 0
+    src_mtime = os.stat(source).st_mtime
+    filename = os.path.basename(source)
+    with Image.open(source) as im:
+        im = ImageOps.exif_transpose(im)  # phone photos carry their rotation in EXIF
+        if im.mode not in ("RGB", "L"):
+            im = im.convert("RGB")
+        # never upscale; the original width caps the set
+        widths = [w for w in DERIVED_WIDTHS if w < im.width] or [im.width]
+        for width in widths:
+            height = round(im.height * width / im.width)
+            resized = None
+            for fmt, options in (
+                ("webp", {"quality": WEBP_QUALITY, "method": 6}),
+                ("jpg", {"quality": JPEG_QUALITY, "optimize": True, "progressive": True}),
+            ):
+                out = os.path.join(out_dir, _derived_name(filename, width, fmt))
+                if not force and os.path.exists(out) and os.stat(out).st_mtime >= src_mtime:
+                    continue
+                if resized is None:
+                    resized = im.resize((width, height), Image.LANCZOS)
+                resized.save(out, "WEBP" if fmt == "webp" else "JPEG", **options)
+                written += 1
+    return written
+
+
+def generate_derivatives(force: bool = False) -> dict:
+    """
+    Write resized WebP/JPEG copies of every property photo into <id>/_derived/,
+    skipping ones newer than their source, then rebuild the manifest.
+    """
+    root = images_root()
+    written = 0
+    for prop_id in _property_dirs(root):
+        path = os.path.join(root, prop_id)
+        out_dir = os.path.join(path, DERIVED_DIR)
+        try:
+            os.makedirs(out_dir, exist_ok=True)
+        except OSError:
+            # read-only checkout (e.g. a production image): serve the originals
+            frappe.log_error(f"Cannot write {out_dir}", "generate_derivatives")
+            break
+        for f in sorted(os.listdir(path)):
+            source = os.path.join(path, f)
+            if not (f.lower().endswith(IMAGE_EXTS) and os.path.isfile(source)):
+                continue
+            try:
+                written += _derive_one(source, out_dir, force)
+            except OSError:
+                # format Pillow can't decode here (e.g. AVIF without the plugin), or an
+                # unwritable _derived/: serve the original
+                frappe.log_error(f"Could not derive {prop_id}/{f}", "generate_derivatives")
+    build_manifest()
+    return {"written": written}
+
+
+def after_migrate():
+    """Refresh derivatives (incremental) and the manifest after bench migrate."""
+    if importlib.util.find_spec("PIL") is None:
+        build_manifest()
+        return
+    generate_derivatives()
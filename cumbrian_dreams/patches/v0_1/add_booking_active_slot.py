@@ -0,0 +1,32 @@
+import frappe
+
+from cumbrian_dreams.cumbrian_dreams.doctype.booking.booking import ensure_active_slot
+
+
+def execute():
+    # the unique index can't be built over existing double bookings: keep the
+    # earliest Active booking per (property, day) and cancel the rest
+    dupes = frappe.db.sql(
+        """
+        SELECT b.name
+        FROM `tabBooking` b
+        WHERE b.status = 'Active'
+          AND EXISTS (
+            SELECT 1 FROM `tabBooking` o
+            WHERE o.property = b.property
+              AND o.booking_date = b.booking_date
+              AND o.status = 'Active'
+              AND (o.creation < b.creation OR (o.creation = b.creation AND o.name < b.name))
+          )
+        """,
+        pluck=True,
+    )
+    for name in dupes:
+        frappe.db.set_value(
+            "Booking",
+            name,
+            {"status": "Cancelled", "cancel_reason": "Duplicate booking (cancelled by migration)"},
+            update_modified=False,
+        )
+
+    ensure_active_slot()
@@ -0,0 +1,10 @@
+import frappe
+
+from cumbrian_dreams.cumbrian_dreams.doctype.booking import booking
+from cumbrian_dreams.cumbrian_dreams.doctype.property import property as property_controller
+
+
+def execute():
+    for index_name, fields in booking.INDEXES.items():
+        frappe.db.add_index("Booking", fields, index_name=index_name)
+    property_controller.on_doctype_update()
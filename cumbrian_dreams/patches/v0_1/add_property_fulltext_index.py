@@ -0,0 +1,5 @@
+from cumbrian_dreams.search import ensure_fulltext_index
+
+
+def execute():
+    ensure_fulltext_index()
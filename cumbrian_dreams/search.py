@@ -0,0 +1,550 @@
+# apps/cumbrian_dreams/cumbrian_dreams/search.py
+"""
+Property search shared by the /properties page and api.list_properties.
+
+Date filtering runs in the database: a property is returned only when no
+Active Booking and no ingested External Availability row blocks any night of
+the stay. Both checks are NOT EXISTS probes on (property, date) indexes, so
+the cost per property stays constant however many bookings and synced days
+pile up.
+
+Free text (`q`) uses a MariaDB FULLTEXT index over title, location and
+features (InnoDB keeps it in step with every insert, update and delete).
+Each word must match as a prefix (InnoDB stopwords are skipped), and
+results can be ranked by relevance.
+Other databases, and words shorter than the index's minimum token length,
+fall back to LIKE.
+
+list_properties responses are cached per normalized query. Keys embed a
+generation counter that Property changes bump (plus an availability
+generation for date searches, bumped by Booking changes and syncs), so an
+edit invalidates every cached page at once without scanning keys.
+"""
+import hashlib
+import heapq
+import json
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from datetime import date, timedelta
+
+import frappe
+from frappe.query_builder import Order
+from frappe.utils import cint, getdate
+from pypika import Case
+from pypika.functions import Count, Trim
+from pypika.terms import ExistsCriterion, Term, ValueWrapper
+from pypika.utils import format_alias_sql
+
+# longest stay the search accepts (nights)
+MAX_STAY_NIGHTS = 60
+
+FULLTEXT_INDEX = "property_text_fulltext"
+FULLTEXT_FIELDS = ("title", "location", "features")
+# innodb_ft_min_token_size: shorter words are not in the index
+MIN_TOKEN_LEN = 3
+# InnoDB's default FULLTEXT stopwords (INNODB_FT_DEFAULT_STOPWORD): never indexed,
+# so a required +word* on one of them matches nothing
+FULLTEXT_STOPWORDS = frozenset((
+    "a", "about", "an", "are", "as", "at", "be", "by", "com", "de", "en", "for", "from", "how", "i",
+    "in", "is", "it", "la", "of", "on", "or", "that", "the", "this", "to", "was", "what", "when",
+    "where", "who", "will", "with", "und", "www",
+))
+
+DEFAULT_LISTING_CACHE_TTL = 300
+LISTING_GEN_KEY = "listing:gen"
+AVAILABILITY_GEN_KEY = "listing:avail_gen"
+LISTING_STAT_KEYS = ("hit", "miss")
+
+# facet price histogram: [lo, hi) per night, open-ended last bucket
+PRICE_BUCKETS = ((0, 50), (50, 100), (100, 150), (150, 200), (200, 300), (300, None))
+FACET_TOP = 20
+FEATURE_SPLIT_RE = re.compile(r"[,;\n\r•|]+")
+MAX_FEATURE_TAG_LEN = 40
+
+# location typeahead: how often a worker checks the listing generation, and scan cap per lookup
+TYPEAHEAD_GEN_CHECK = 1.0
+TYPEAHEAD_MAX_SCAN = 2000
+
+ORDER_FIELDS = {
+    "relevance": "relevance",
+    "price": "price_per_night",
+    "title": "title",
+    "location": "location",
+    "modified": "modified",
+    "name": "name",
+}
+
+
+def stay_range(from_date=None, to_date=None) -> tuple[date, date] | None:
+    """
+    (check_in, check_out) from the listing's from_date / to_date, check_out
+    exclusive. A missing to_date means one night. None when no dates are given.
+    """
+    if not from_date:
+        return None
+    try:
+        check_in = getdate(from_date)
+        check_out = getdate(to_date) if to_date else check_in + timedelta(days=1)
+    except Exception:
+        frappe.throw("Dates must be YYYY-MM-DD", exc=frappe.ValidationError)
+    if check_out <= check_in:
+        frappe.throw("to_date must be after from_date", exc=frappe.ValidationError)
+    if (check_out - check_in).days > MAX_STAY_NIGHTS:
+        frappe.throw(f"Stays are limited to {MAX_STAY_NIGHTS} nights", exc=frappe.ValidationError)
+    return check_in, check_out
+
+
+def parse_order(order_by: str | None, q: str | None = None) -> tuple[str, str]:
+    """
+    Whitelisted (fieldname, direction) from 'price asc' style input. Without
+    an explicit order, text searches rank by relevance, everything else by modified.
+    """
+    parts = (order_by or "").strip().split()
+    default = "relevance" if q else "modified"
+    key = ORDER_FIELDS.get(parts[0].lower(), default) if parts else default
+    direction = parts[1].lower() if len(parts) > 1 and parts[1].lower() in ("asc", "desc") else "desc"
+    return key, direction
+
+
+class Match(Term):
+    """MATCH (columns) AGAINST (value IN BOOLEAN MODE)."""
+
+    def __init__(self, columns, against: str, alias=None):
+        super().__init__(alias=alias)
+        self.columns = columns
+        self.against = ValueWrapper(against)
+
+    def get_sql(self, **kwargs):
+        cols = ", ".join(c.get_sql(**kwargs) for c in self.columns)
+        sql = f"MATCH ({cols}) AGAINST ({self.against.get_sql(**kwargs)} IN BOOLEAN MODE)"
+        return format_alias_sql(sql, self.alias, **kwargs)
+
+
+def fulltext_supported() -> bool:
+    return frappe.db.db_type == "mariadb"
+
+
+def ensure_fulltext_index():
+    """Create the Property FULLTEXT index if it is missing (MariaDB only)."""
+    if not fulltext_supported():
+        return
+    if frappe.db.sql("SHOW INDEX FROM `tabProperty` WHERE Key_name = %s", FULLTEXT_INDEX):
+        return
+    cols = ", ".join(f"`{f}`" for f in FULLTEXT_FIELDS)
+    frappe.db.sql_ddl(f"ALTER TABLE `tabProperty` ADD FULLTEXT INDEX `{FULLTEXT_INDEX}` ({cols})")
+
+
+def text_match(prop, q: str):
+    """
+    (criterion, score) for a free-text query on Property. `score` is the
+    MATCH expression to rank by, or None when only LIKE could be used.
+    Stopwords are left out ("cottage with hot tub" needs cottage, hot and tub).
+    """
+    words = [w for w in re.findall(r"\w+", q or "") if w.lower() not in FULLTEXT_STOPWORDS]
+    long_words = [w for w in words if len(w) >= MIN_TOKEN_LEN]
+
+    def _like(term):
+        like = f"%{term}%"
+        return prop.title.like(like) | prop.location.like(like) | prop.features.like(like)
+
+    if not fulltext_supported() or not long_words:
+        return _like(q.strip()), None
+
+    score = Match([prop[f] for f in FULLTEXT_FIELDS], " ".join(f"+{w}*" for w in long_words))
+    criterion = score > 0
+    for w in words:
+        if len(w) < MIN_TOKEN_LEN:
+            criterion &= _like(w)
+    return criterion, score
+
+
+def available_between(query, prop, check_in: date, check_out: date):
+    """Restrict a query on Property to rows free for every night in [check_in, check_out)."""
+    booking = frappe.qb.DocType("Booking")
+    ext = frappe.qb.DocType("External Availability")
+
+    booked = (
+        frappe.qb.from_(booking)
+        .select(booking.name)
+        .where(booking.property == prop.name)
+        .where(booking.status == "Active")
+        .where(booking.booking_date >= check_in)
+        .where(booking.booking_date < check_out)
+    )
+    # same rules as freetobook.stay_available()
+    closed_upstream = (
+        frappe.qb.from_(ext)
+        .select(ext.name)
+        .where(ext.property == prop.name)
+        .where(ext.date >= check_in)
+        .where(ext.date <= check_out)
+        .where(
+            ((ext.date < check_out) & (ext.stay_blocked == 1))
+            | ((ext.date == check_in) & (ext.closed_to_arrival == 1))
+            | ((ext.date == check_out) & (ext.closed_to_departure == 1))
+        )
+    )
+    return query.where(ExistsCriterion(booked).negate()).where(ExistsCriterion(closed_upstream).negate())
+
+
+def keyset_after(query, table, key: str, direction: str, value, name: str):
+    """
+    Rows strictly after (value, name) in `order by key direction, name direction`.
+    NULL keys sort first ascending / last descending, as MariaDB does.
+    """
+    col = table[key]
+    if direction == "asc":
+        if value is None:
+            return query.where((col.isnull() & (table.name > name)) | col.notnull())
+        return query.where((col > value) | ((col == value) & (table.name > name)))
+    if value is None:
+        return query.where(col.isnull() & (table.name < name))
+    return query.where((col < value) | ((col == value) & (table.name < name)) | col.isnull())
+
+
+def _filtered(query, prop, *, host=None, location=None, min_price=None, max_price=None, q=None, stay=None):
+    """Apply the listing filters to a query on Property; returns (query, relevance score or None)."""
+    if host:
+        query = query.where(prop.host == host)
+    if location:
+        query = query.where(prop.location.like(f"%{location}%"))
+    if min_price is not None:
+        query = query.where(prop.price_per_night >= min_price)
+    if max_price is not None:
+        query = query.where(prop.price_per_night <= max_price)
+    score = None
+    if q and q.strip():
+        criterion, score = text_match(prop, q)
+        query = query.where(criterion)
+    if stay:
+        query = available_between(query, prop, *stay)
+    return query, score
+
+
+def search_properties(
+    fields: list[str],
+    *,
+    host: str | None = None,
+    location: str | None = None,
+    min_price: float | None = None,
+    max_price: float | None = None,
+    q: str | None = None,
+    stay: tuple[date, date] | None = None,
+    order: tuple[str, str] = ("modified", "desc"),
+    limit: int = 20,
+    offset: int = 0,
+    after: tuple | None = None,
+    run: bool = True,
+) -> list[dict]:
+    """
+    Property rows matching the listing filters, `stay` being a stay_range()
+    result. `after` is the (order value, name) of the previous page's last row.
+    With run=False the query is returned unexecuted (for EXPLAIN).
+    """
+    prop = frappe.qb.DocType("Property")
+    query, score = _filtered(
+        frappe.qb.from_(prop).select(*(prop[f] for f in fields)), prop,
+        host=host, location=location, min_price=min_price, max_price=max_price, q=q, stay=stay,
+    )
+
+    key, direction = order
+    sort = Order.asc if direction == "asc" else Order.desc
+    if key == "relevance":
+        if score is not None:
+            query = query.orderby(score, order=sort)
+        key = "modified"  # no score to rank by (or ties): newest first
+    elif after:
+        query = keyset_after(query, prop, key, direction, *after)
+    query = query.orderby(prop[key], order=sort)
+    if key != "name":
+        query = query.orderby(prop.name, order=sort)  # stable paging on ties
+
+    query = query.limit(limit).offset(offset)
+    return query.run(as_dict=True) if run else query
+
+
+def search_bookings(
+    fields: list[str],
+    *,
+    status: str | None = None,
+    property: str | None = None,
+    user: str | None = None,
+    host: str | None = None,
+    q: str | None = None,
+    from_date=None,
+    to_date=None,
+    order: tuple[str, str] = ("booking_date", "desc"),
+    limit: int = 20,
+    offset: int = 0,
+    after: tuple | None = None,
+    run: bool = True,
+) -> list[dict]:
+    """
+    Booking rows for list_bookings and the host bookings page. `host` and `q`
+    filter on the booked Property through a join on its primary key, so the
+    database resolves them in the same query instead of being handed an IN
+    list of every matching property name. `after` and run=False work as in
+    search_properties().
+    """
+    booking = frappe.qb.DocType("Booking")
+    query = frappe.qb.from_(booking).select(*(booking[f] for f in fields))
+    if status:
+        query = query.where(booking.status == status)
+    if property:
+        query = query.where(booking.property == property)
+    if user:
+        query = query.where(booking.user == user)
+    if from_date is not None:
+        query = query.where(booking.booking_date >= from_date)
+    if to_date is not None:
+        query = query.where(booking.booking_date <= to_date)
+
+    if host or (q and q.strip()):
+        prop = frappe.qb.DocType("Property")
+        query = query.join(prop).on(prop.name == booking.property)
+        if host:
+            query = query.where(prop.host == host)
+        if q and q.strip():
+            query = query.where(text_match(prop, q)[0])
+
+    key, direction = order
+    sort = Order.asc if direction == "asc" else Order.desc
+    if after:
+        query = keyset_after(query, booking, key, direction, *after)
+    query = query.orderby(booking[key], order=sort)
+    if key != "name":
+        query = query.orderby(booking.name, order=sort)  # stable paging on ties
+
+    query = query.limit(limit).offset(offset)
+    return query.run(as_dict=True) if run else query
+
+
+def _price_bucket_label(lo, hi) -> str:
+    return f"{lo}-{hi}" if hi is not None else f"{lo}+"
+
+
+def feature_tags(features: str | None) -> list[str]:
+    """Short comma / newline / bullet separated items of a features text (prose is skipped)."""
+    tags = []
+    for part in FEATURE_SPLIT_RE.split(features or ""):
+        tag = part.strip(" .-*\t")
+        if tag and len(tag) <= MAX_FEATURE_TAG_LEN:
+            tags.append(tag)
+    return tags
+
+
+def property_facets(
+    *,
+    host: str | None = None,
+    location: str | None = None,
+    min_price: float | None = None,
+    max_price: float | None = None,
+    q: str | None = None,
+    stay: tuple[date, date] | None = None,
+    top: int = FACET_TOP,
+) -> dict:
+    """
+    Location counts, price buckets and feature-tag counts over every property
+    matching the listing filters. Locations and price buckets are GROUP BY
+    queries; feature tags are split out of the text in Python, so only the
+    features column of matching rows is read for them.
+    """
+    prop = frappe.qb.DocType("Property")
+
+    def _query(*terms):
+        query, _ = _filtered(
+            frappe.qb.from_(prop).select(*terms), prop,
+            host=host, location=location, min_price=min_price, max_price=max_price, q=q, stay=stay,
+        )
+        return query
+
+    # first bucket whose upper bound is above the price; NULL prices group apart (counted in total only)
+    price, bucket = prop.price_per_night, Case()
+    for lo, hi in PRICE_BUCKETS:
+        bucket = bucket.when(price.notnull() if hi is None else price < hi, _price_bucket_label(lo, hi))
+    price_rows = _query(bucket.as_("bucket"), Count("*").as_("n")).groupby(bucket).run(as_dict=True)
+    prices = {r.bucket: r.n for r in price_rows if r.bucket}
+
+    loc = Trim(prop.location)
+    location_rows = (
+        _query(loc.as_("value"), Count("*").as_("n"))
+        .where(prop.location.notnull())
+        .where(loc != "")
+        .groupby(loc)
+        .orderby(Count("*"), order=Order.desc)
+        .orderby(loc)
+        .limit(top)
+        .run(as_dict=True)
+    )
+
+    tags, tag_labels = {}, {}
+    for features in _query(prop.features).where(prop.features.notnull()).run(pluck=True):
+        # count each tag once per property, case-insensitively; show the first spelling seen
+        for tag in {t.lower(): t for t in feature_tags(features)}.values():
+            key = tag.lower()
+            tag_labels.setdefault(key, tag)
+            tags[key] = tags.get(key, 0) + 1
+    ranked = sorted(tags.items(), key=lambda kv: (-kv[1], kv[0]))[:top]
+
+    price_facets = []
+    for lo, hi in PRICE_BUCKETS:
+        label = _price_bucket_label(lo, hi)
+        if prices.get(label):
+            price_facets.append({"bucket": label, "min": lo, "max": hi, "count": prices[label]})
+
+    return {
+        "total": sum(r.n for r in price_rows),
+        "location": [{"value": r.value, "count": r.n} for r in location_rows],
+        "price": price_facets,
+        "features": [{"value": tag_labels[k], "count": n} for k, n in ranked],
+    }
+
+
+# ---------------------------------------------------------------------------
+# listing response cache
+# ---------------------------------------------------------------------------
+
+
+def _generation(key: str) -> int:
+    return int(frappe.cache().get(frappe.cache().make_key(key)) or 0)
+
+
+def _bump_after_commit(key: str):
+    # bump once the change is visible; bumping before commit would let a
+    # concurrent reader cache the old rows under the new generation
+    made = frappe.cache().make_key(key)
+    frappe.db.after_commit.add(lambda: frappe.cache().incr(made))
+
+
+def bump_listing_generation(doc=None, method=None):
+    """doc_events hook (Property): invalidate every cached listing page."""
+    _bump_after_commit(LISTING_GEN_KEY)
+
+
+def bump_availability_generation(doc=None, method=None):
+    """doc_events hook (Booking) and sync: invalidate cached date searches."""
+    _bump_after_commit(AVAILABILITY_GEN_KEY)
+
+
+def listing_cache_ttl() -> int:
+    return cint(frappe.conf.get("listing_cache_ttl") or DEFAULT_LISTING_CACHE_TTL)
+
+
+def cached_listing(params: dict, compute):
+    """
+    compute() once per normalized `params` and generation. Only call with
+    params that fully determine the response (see api.list_properties).
+    """
+    ttl = listing_cache_ttl()
+    if ttl <= 0:
+        return compute()
+
+    cache = frappe.cache()
+    gens = [_generation(LISTING_GEN_KEY)]
+    if params.get("stay"):
+        gens.append(_generation(AVAILABILITY_GEN_KEY))
+    raw = json.dumps([gens, params], sort_keys=True, separators=(",", ":"), default=str)
+    key = f"listing:page:{hashlib.sha1(raw.encode()).hexdigest()}"
+
+    hit = cache.get_value(key, expires=True)
+    if hit is not None:
+        cache.incr(cache.make_key("listing:stats:hit"))
+        return hit
+
+    cache.incr(cache.make_key("listing:stats:miss"))
+    value = compute()
+    cache.set_value(key, value, expires_in_sec=ttl)
+    return value
+
+
+def listing_cache_stats() -> dict:
+    cache = frappe.cache()
+    stats = {k: int(cache.get(cache.make_key(f"listing:stats:{k}")) or 0) for k in LISTING_STAT_KEYS}
+    total = stats["hit"] + stats["miss"]
+    stats["hit_rate"] = round(stats["hit"] / total, 3) if total else None
+    stats["generation"] = _generation(LISTING_GEN_KEY)
+    stats["availability_generation"] = _generation(AVAILABILITY_GEN_KEY)
+    return stats
+
+
+# ---------------------------------------------------------------------------
+# location typeahead
+# ---------------------------------------------------------------------------
+
+_loc_index = None  # {"gen", "keys", "refs", "labels", "counts"}
+_loc_checked_at = 0.0
+_loc_lock = threading.Lock()
+
+
+def _build_location_index(gen: int) -> dict:
+    """
+    Sorted keys for every word start of every location ("lake district, cumbria"
+    is findable as "lak", "dis" or "cum"), each pointing at the location.
+    Spellings differing only in case or surrounding spaces are one location,
+    labelled with its most used spelling.
+    """
+    rows = frappe.get_all(
+        "Property",
+        filters=[["Property", "location", "is", "set"]],
+        fields=["location", "count(name) as count"],
+        group_by="location",
+    )
+    spellings = {}
+    for r in rows:
+        label = r.location.strip()
+        if label:
+            spellings.setdefault(label.casefold(), Counter())[label] += r.count
+    # rank order (most properties first), so a lookup only needs the smallest refs
+    ranked = sorted(
+        (
+            (min(c, key=lambda sp, c=c: (-c[sp], sp)), c.total(), norm)
+            for norm, c in spellings.items()
+        ),
+        key=lambda lc: (-lc[1], lc[0]),
+    )
+    labels, counts, pairs = [loc for loc, _, _ in ranked], [n for _, n, _ in ranked], []
+    for i, (_, _, low) in enumerate(ranked):
+        for m in re.finditer(r"\w+", low):
+            pairs.append((low[m.start():], i))
+    pairs.sort()
+    return {
+        "gen": gen,
+        "keys": [k for k, _ in pairs],
+        "refs": [i for _, i in pairs],
+        "labels": labels,
+        "counts": counts,
+    }
+
+
+def location_index() -> dict:
+    """This worker's index; rebuilt when Property changes bumped the listing generation."""
+    global _loc_index, _loc_checked_at
+    now = time.monotonic()
+    if _loc_index is not None and now - _loc_checked_at < TYPEAHEAD_GEN_CHECK:
+        return _loc_index
+    with _loc_lock:
+        gen = _generation(LISTING_GEN_KEY)
+        if _loc_index is None or _loc_index["gen"] != gen:
+            _loc_index = _build_location_index(gen)
+        _loc_checked_at = now
+        return _loc_index
+
+
+def suggest_locations(prefix: str, limit: int = 8) -> list[dict]:
+    """Locations with a word starting with `prefix`, most properties first."""
+    prefix = (prefix or "").strip().casefold()
+    if not prefix:
+        return []
+    index = location_index()
+    keys, refs = index["keys"], index["refs"]
+    seen = set()
+    pos = bisect_left(keys, prefix)
+    end = min(len(keys), pos + TYPEAHEAD_MAX_SCAN)
+    while pos < end and keys[pos].startswith(prefix):
+        seen.add(refs[pos])
+        pos += 1
+    best = heapq.nsmallest(limit, seen)
+    return [{"value": index["labels"][i], "count": index["counts"][i]} for i in best]
@@ -0,0 +1,63 @@
+# apps/cumbrian_dreams/cumbrian_dreams/tasks.py
+import frappe
+import requests
+from frappe.utils import add_days, cint, getdate, now_datetime, nowdate
+
+from cumbrian_dreams import freetobook
+from cumbrian_dreams.cumbrian_dreams.doctype.external_availability.external_availability import upsert_days
+from cumbrian_dreams.search import bump_availability_generation
+
+# days ahead to ingest; the property page asks for two years
+DEFAULT_SYNC_DAYS = 760
+
+
+def sync_external_availability():
+    """Hourly: queue an availability sync for every Property linked to FreeToBook."""
+    props = frappe.get_all(
+        "Property",
+        filters=[["Property", "external_property_id", ">", 0]],
+        pluck="name",
+    )
+    for name in props:
+        frappe.enqueue(
+            "cumbrian_dreams.tasks.sync_property_availability",
+            queue="long",
+            job_id=f"ftb-sync:{name}",
+            deduplicate=True,
+            property_name=name,
+        )
+
+
+def sync_property_availability(property_name: str):
+    """
+    Pull one property's upstream availability into External Availability.
+    Only chunks whose TTL tier has expired are fetched upstream, but the whole
+    window is reconciled against the store (unchanged days are skipped by digest).
+    """
+    ext_id = frappe.db.get_value("Property", property_name, "external_property_id")
+    if not ext_id:
+        return
+
+    start = getdate(nowdate())
+    end = add_days(start, cint(frappe.conf.get("ftb_sync_days") or DEFAULT_SYNC_DAYS))
+    meta = {}
+    try:
+        entries = freetobook.get_availability(ext_id, start, end, allow_stale=False, meta=meta)
+    except (requests.RequestException, freetobook.UpstreamNonJSON, freetobook.UpstreamUnavailable) as e:
+        frappe.log_error(f"FTB sync {property_name} ({ext_id}): {e}", "sync_property_availability")
+        return
+    if meta.get("degraded"):
+        # upstream is failing and we only have last known good data; keep the previous sync
+        return
+
+    # every chunk in the window, cached or re-pulled: a chunk refreshed by a request
+    # (or a cache flush) since the last sync would otherwise never reach the store
+    if upsert_days(property_name, ext_id, entries, from_date=start, to_date=end):
+        bump_availability_generation()
+    frappe.db.set_value(
+        "Property",
+        property_name,
+        {"availability_synced_at": now_datetime(), "availability_synced_to": end},
+        update_modified=False,
+    )
+    frappe.db.commit()
@@ -3,6 +3,8 @@ import frappe
 from frappe.utils import getdate
 from datetime import date
 
+from cumbrian_dreams import auth
+
 ALLOWED_ROLES = {"System Manager", "Support", "Host"}
 
 def get_context(context):
@@ -12,20 +14,14 @@ def get_context(context):
         frappe.local.flags.redirect_location = "/login?redirect-to=/book_on_behalf"
         raise frappe.Redirect
 
-    roles = set(frappe.get_roles(user))
+    roles = auth.roles(user)
     if not (roles & ALLOWED_ROLES):
         # 403
         frappe.throw("You do not have access to this page.", frappe.PermissionError)
 
     # Host can only see their properties; SM/Support see all
     if "Host" in roles and "System Manager" not in roles and "Support" not in roles:
-        props = frappe.get_all(
-            "Property",
-            filters={"host": user},
-            fields=["name", "title", "location", "price_per_night"],
-            order_by="modified desc",
-            limit_page_length=500,
-        )
+        props = auth.host_properties(user)[:500]
     else:
         props = frappe.get_all(
             "Property",
@@ -1,6 +1,8 @@
 # apps/cumbrian_dreams/cumbrian_dreams/templates/pages/create_property.py
 import frappe
 
+from cumbrian_dreams import auth
+
 def get_context(context):
     user = frappe.session.user
     if user == "Guest":
@@ -8,7 +10,7 @@ def get_context(context):
         frappe.local.flags.redirect_location = "/login?redirect-to=/create_property"
         raise frappe.Redirect
 
-    roles = set(frappe.get_roles(user))
+    roles = auth.roles(user)
     if not (("Host" in roles) or ("System Manager" in roles)):
         # 403
         frappe.throw("Host or System Manager role required.", frappe.PermissionError)
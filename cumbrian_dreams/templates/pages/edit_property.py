@@ -1,6 +1,8 @@
 # apps/cumbrian_dreams/cumbrian_dreams/templates/pages/edit_property.py
 import frappe
 
+from cumbrian_dreams import auth
+
 def _redirect(url: str):
     frappe.local.flags.redirect_location = url
     raise frappe.Redirect
@@ -10,7 +12,7 @@ def get_context(context):
     if user == "Guest":
         _redirect("/login?redirect-to=/my_properties")
 
-    roles = set(frappe.get_roles(user))
+    roles = auth.roles(user)
     is_sm = "System Manager" in roles
     is_host_role = "Host" in roles
 
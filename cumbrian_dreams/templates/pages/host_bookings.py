@@ -2,6 +2,9 @@
 import frappe
 from frappe.utils import getdate
 
+from cumbrian_dreams import auth
+from cumbrian_dreams.search import search_bookings
+
 def _redirect(url: str):
     frappe.local.flags.redirect_location = url
     raise frappe.Redirect
@@ -13,7 +16,7 @@ def get_context(context):
     if user == "Guest":
         _redirect("/login?redirect-to=/host_bookings")
 
-    roles = set(frappe.get_roles(user))
+    roles = auth.roles(user)
     is_system_manager = "System Manager" in roles
     is_host = "Host" in roles
     if not (is_host or is_system_manager):
@@ -38,34 +41,25 @@ def get_context(context):
         offset = 0
 
     host_email = form.get("host") if (is_system_manager and form.get("host")) else user
-    host_props = frappe.get_all("Property", filters={"host": host_email}, fields=["name", "title", "location"])
-    host_prop_names = [p["name"] for p in host_props]
+    host_props = auth.host_properties(host_email)
 
     context.host_props = host_props
-    if not host_prop_names:
+    if not host_props:
         context.items = []
         context.filters = {"property": "", "status": status, "from_date": from_date or "", "to_date": to_date or "", "limit": limit, "offset": offset}
         context.paging = {"has_more": False, "next_offset": None}
         context.no_cache = 1
         return
 
-    filters = [["Booking", "property", "in", host_prop_names]]
-    if property_filter:
-        filters.append(["Booking", "property", "=", property_filter])
-    if status != "All":
-        filters.append(["Booking", "status", "=", status])
-    if from_date:
-        filters.append(["Booking", "booking_date", ">=", getdate(from_date)])
-    if to_date:
-        filters.append(["Booking", "booking_date", "<=", getdate(to_date)])
-
-    rows = frappe.get_all(
-        "Booking",
-        fields=["name", "property", "user", "booking_date", "payment_completed", "status", "modified"],
-        filters=filters,
-        order_by="booking_date desc",
-        limit_start=offset,
-        limit_page_length=limit + 1,
+    rows = search_bookings(
+        ["name", "property", "user", "booking_date", "payment_completed", "status", "modified"],
+        status=None if status == "All" else status,
+        property=property_filter,
+        host=host_email,
+        from_date=getdate(from_date) if from_date else None,
+        to_date=getdate(to_date) if to_date else None,
+        limit=limit + 1,
+        offset=offset,
     )
     has_more = len(rows) > limit
     items = rows[:limit]
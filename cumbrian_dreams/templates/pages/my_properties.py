@@ -1,25 +1,21 @@
 # apps/cumbrian_dreams/cumbrian_dreams/templates/pages/my_properties.py
 import frappe
 
+from cumbrian_dreams import auth
+
 def get_context(context):
     user = frappe.session.user
     if user == "Guest":
         frappe.local.flags.redirect_location = "/login?redirect-to=/my_properties"
         raise frappe.Redirect
 
-    roles = set(frappe.get_roles(user))
+    roles = auth.roles(user)
     is_sm = "System Manager" in roles
 
     form = frappe.form_dict
     host_filter = form.get("host") if is_sm and form.get("host") else user
 
-    props = frappe.get_all(
-        "Property",
-        filters={"host": host_filter} if host_filter else {},
-        fields=["name","title","location","price_per_night","host","modified"],
-        order_by="modified desc",
-        limit_page_length=500
-    )
+    props = auth.host_properties(host_filter)[:500]
 
     context.is_system_manager = is_sm
     context.host_filter = host_filter or ""
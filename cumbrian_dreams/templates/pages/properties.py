@@ -1,10 +1,10 @@
 # apps/cumbrian_dreams/cumbrian_dreams/templates/pages/properties.py
-import os
 import json
 import frappe
 from frappe.utils import now_datetime, cint
 
-IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".webp", ".avif", ".gif")
+from cumbrian_dreams.images import property_images, responsive
+from cumbrian_dreams.search import search_properties, stay_range
 
 def _coerce_prop_id(prop) -> str:
     """
@@ -19,41 +19,13 @@ def _coerce_prop_id(prop) -> str:
         raw = prop or ""
     return str(raw).strip()
 
-def _assets_dir_for(prop) -> tuple[str, str]:
-    """Return (filesystem_dir, prop_id) for this property."""
-    prop_id = _coerce_prop_id(prop)
-    base = os.path.join(
-        frappe.get_app_path("cumbrian_dreams"),
-        "public","img", "properties", prop_id
-    )
-    return base, prop_id
-
 def _first_asset_image(prop) -> str | None:
     """
-    Pick the first reasonable image for this property from /public/properties/<id>/.
-    Preference: cover.*, 01.*, 1.*, main.*, hero.* — then alphabetical.
+    Card image for this property from /public/img/properties/<id>/ (via the
+    image manifest). Preference: cover.*, 01.*, 1.*, main.*, hero.* — then alphabetical.
     """
-    base, prop_id = _assets_dir_for(prop)
-    if not os.path.isdir(base):
-        return None
-
-    preferred_stems = ("cover", "01", "1", "main", "hero")
-    for stem in preferred_stems:
-        for ext in IMAGE_EXTS:
-            fn = f"{stem}{ext}"
-            p = os.path.join(base, fn)
-            if os.path.isfile(p):
-                return f"/assets/cumbrian_dreams/img/properties/{prop_id}/{fn}"
-
-    try:
-        for fn in sorted(os.listdir(base), key=str.lower):
-            full = os.path.join(base, fn)
-            if os.path.isfile(full) and fn.lower().endswith(IMAGE_EXTS):
-                return f"/assets/cumbrian_dreams/img/properties/{prop_id}/{fn}"
-    except Exception:
-        pass
-
-    return None
+    images = property_images(_coerce_prop_id(prop))
+    return images["cover"] if images else None
 
 def get_context(context):
     form = frappe.form_dict
@@ -67,15 +39,24 @@ def get_context(context):
         if has(fn):
             fields.append(fn)
 
-    items = frappe.get_all(
-        "Property",
-        filters={},
-        fields=fields,
-        order_by="modified desc",
-        start=offset,
-        page_length=limit,
-        as_list=False,
+    location = (form.get("location") or "").strip()
+    try:
+        stay = stay_range(form.get("from_date"), form.get("to_date"))
+    except frappe.ValidationError:
+        # bad dates from a hand-edited URL: list without the date filter
+        frappe.clear_messages()
+        stay = None
+
+    # one extra row tells us whether there is a next page
+    items = search_properties(
+        fields,
+        location=location or None,
+        stay=stay,
+        limit=limit + 1,
+        offset=offset,
     )
+    has_more = len(items) > limit
+    items = items[:limit]
 
     placeholder = "/assets/cumbrian_dreams/img/placeholder.jpg"
 
@@ -91,6 +72,8 @@ def get_context(context):
         # fill cover_image from assets folder if DB field is empty
         if not p.get("cover_image"):
             p["cover_image"] = _first_asset_image(p) or placeholder
+        # srcset from the resized derivatives, when the cover is one of our static files
+        p["cover_responsive"] = responsive(_coerce_prop_id(p), p["cover_image"])
 
     context.items = items
     context.filters = {
@@ -100,6 +83,6 @@ def get_context(context):
         "from_date": form.get("from_date") or "",
         "to_date": form.get("to_date") or "",
     }
-    context.paging = {"has_more": len(items) == limit, "next_offset": offset + limit}
+    context.paging = {"has_more": has_more, "next_offset": offset + limit}
     context.current_year = now_datetime().year
     context.no_cache = 1
@@ -1,11 +1,11 @@
 # apps/cumbrian_dreams/cumbrian_dreams/templates/pages/property.py
-import os
-import re
 import frappe
 from frappe.utils import nowdate
 from datetime import datetime
 from frappe.utils import now_datetime, cint
 
+from cumbrian_dreams.images import property_images, responsive
+
 try:
     from dateutil.relativedelta import relativedelta
 except Exception:
@@ -17,10 +17,6 @@ def _add_years(d, years):
     except ValueError:
         return d.replace(month=2, day=28, year=d.year + years)
 
-def _natkey(s):
-    # natural sort: 01.jpg, 2.jpg, 10.jpg
-    return [int(t) if t.isdigit() else t.lower() for t in re.split(r"(\d+)", s)]
-
 def get_context(context):
     name = frappe.form_dict.get("name")
     if not name:
@@ -61,26 +57,19 @@ def get_context(context):
                 gallery.insert(0, doc[fn])
             break
 
-    # ----- Fallback: discover static files in /public if DB has none
+    # ----- Fallback: static files in /public (image manifest) if DB has none
+    prop_key = doc.get("external_property_id") or doc["name"]
     if not gallery:
-        prop_key = doc.get("external_property_id") or doc["name"]
-        base_dir = frappe.get_app_path(
-            "cumbrian_dreams", "public", "img", "properties", str(prop_key)
-        )
-        if os.path.isdir(base_dir):
-            exts = (".jpg", ".jpeg", ".png", ".webp", ".gif", ".avif")
-            files = [f for f in os.listdir(base_dir) if f.lower().endswith(exts)]
-            files = sorted(files, key=_natkey)
-            gallery = [
-                f"/assets/cumbrian_dreams/img/properties/{prop_key}/{f}"
-                for f in files
-            ]
+        images = property_images(prop_key)
+        if images:
+            gallery = list(images["gallery"])
             # use first as cover if cover_image is empty
             if not doc.get("cover_image") and gallery:
                 doc["cover_image"] = gallery[0]
 
     context.item = doc
     context.gallery = gallery
+    context.responsive = {src: responsive(prop_key, src) for src in gallery}
     context.today = nowdate()
 
     # 2-year availability URL via your proxy
@@ -91,7 +80,7 @@ def get_context(context):
     prop_id = doc.get("external_property_id") or doc["name"]
     context.availability_url = (
         f"/api/method/cumbrian_dreams.api.fetch_external_availability"
-        f"?property_id={prop_id}&from_date={from_date}&to_date={to_date}"
+        f"?property_id={prop_id}&from_date={from_date}&to_date={to_date}&format=compact"
     )
     context.current_year = now_datetime().year
     context.no_cache = 1
@@ -0,0 +1,75 @@
+# apps/cumbrian_dreams/cumbrian_dreams/tests/test_freetobook.py
+from datetime import date, timedelta
+from itertools import pairwise
+
+from frappe.tests.utils import FrappeTestCase
+
+from cumbrian_dreams.freetobook import (
+    CHUNK_DAYS,
+    CHUNK_EPOCH,
+    DEFAULT_TTL_TIERS,
+    chunk_ttl,
+    chunk_windows,
+    compact_flags,
+    days_cover,
+    stay_available,
+)
+
+# {iso_date: (closed_to_arrival, closed_to_departure, stay_blocked)}
+DAYS = {
+    "2026-03-01": (True, False, False),
+    "2026-03-02": (True, False, True),
+    "2026-03-03": (False, False, True),
+    "2026-03-04": (False, False, False),
+    "2026-03-05": (False, True, False),
+    "2026-03-06": (False, False, False),
+}
+
+
+class TestChunks(FrappeTestCase):
+    def test_windows_are_epoch_aligned_and_cover_the_range(self):
+        start, end = date(2026, 3, 10), date(2027, 6, 1)
+        windows = chunk_windows(start, end)
+        self.assertLessEqual(windows[0][0], start)
+        self.assertGreaterEqual(windows[-1][1], end)
+        for w_start, w_end in windows:
+            self.assertEqual((w_start - CHUNK_EPOCH).days % CHUNK_DAYS, 0)
+            self.assertEqual((w_end - w_start).days, CHUNK_DAYS - 1)
+        for (_, prev_end), (next_start, _) in pairwise(windows):
+            self.assertEqual(next_start, prev_end + timedelta(days=1))
+
+    def test_windows_shared_within_a_chunk(self):
+        # any start inside the same chunk asks for the same (cacheable) windows
+        first = chunk_windows(date(2026, 3, 10), date(2026, 3, 12))
+        self.assertEqual(first, chunk_windows(first[0][0], first[0][0]))
+        self.assertEqual(len(first), 1)
+
+    def test_ttl_tiers(self):
+        today = date(2026, 1, 1)
+        self.assertEqual(chunk_ttl(today - timedelta(days=30), today, DEFAULT_TTL_TIERS), 15 * 60)
+        self.assertEqual(chunk_ttl(today + timedelta(days=60), today, DEFAULT_TTL_TIERS), 15 * 60)
+        self.assertEqual(chunk_ttl(today + timedelta(days=61), today, DEFAULT_TTL_TIERS), 6 * 3600)
+        self.assertEqual(chunk_ttl(today + timedelta(days=400), today, DEFAULT_TTL_TIERS), 24 * 3600)
+        self.assertEqual(chunk_ttl(today + timedelta(days=400), today, [[None, 42]]), 42)
+
+
+class TestStayFlags(FrappeTestCase):
+    def test_compact_flags(self):
+        flags = compact_flags((d, *DAYS[d]) for d in sorted(DAYS))
+        self.assertEqual(flags["closedArr"], [["2026-03-01", "2026-03-02"]])
+        self.assertEqual(flags["closedDep"], [["2026-03-05", "2026-03-05"]])
+        self.assertEqual(flags["stayBlocked"], [["2026-03-02", "2026-03-03"]])
+
+    def test_stay_available(self):
+        self.assertTrue(stay_available(DAYS, "2026-03-04", "2026-03-06"))
+        self.assertFalse(stay_available(DAYS, "2026-03-01", "2026-03-02"))  # closed to arrival
+        self.assertFalse(stay_available(DAYS, "2026-03-04", "2026-03-05"))  # closed to departure
+        self.assertFalse(stay_available(DAYS, "2026-03-03", "2026-03-04"))  # night blocked
+        self.assertFalse(stay_available(DAYS, "2026-03-04", "2026-03-04"))  # no nights
+
+    def test_days_cover(self):
+        self.assertTrue(days_cover(DAYS, "2026-03-04", "2026-03-06"))
+        self.assertFalse(days_cover(DAYS, "2026-03-05", "2026-03-07"))
+        # missing days read as open, which is why callers check days_cover() first
+        self.assertTrue(stay_available(DAYS, "2026-03-06", "2026-03-08"))
+        self.assertFalse(days_cover(DAYS, "2026-03-06", "2026-03-08"))
@@ -0,0 +1,43 @@
+# apps/cumbrian_dreams/cumbrian_dreams/tests/test_query_plans.py
+from datetime import date, timedelta
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import now_datetime
+
+from cumbrian_dreams.benchmarks import query_plans
+
+PREFIX = "TEST-QP-"
+
+
+class TestQueryPlans(FrappeTestCase):
+    """The hot listing / booking queries can use the indexes they were built around."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        if frappe.db.db_type != "mariadb":
+            return
+        # a few rows so EXPLAIN plans real lookups (FrappeTestCase rolls them back)
+        now, today = now_datetime(), date.today()
+        host = "test-qp-host@example.com"
+        frappe.db.bulk_insert(
+            "Property",
+            ["name", "creation", "modified", "owner", "modified_by", "title", "host", "location", "price_per_night"],
+            [(f"{PREFIX}P{i}", now, now, "Administrator", "Administrator", f"Test cottage {i}", host, "Keswick",
+              80 + i) for i in range(3)],
+        )
+        frappe.db.bulk_insert(
+            "Booking",
+            ["name", "creation", "modified", "owner", "modified_by", "property", "user", "booking_date", "status",
+             "payment_completed"],
+            [(f"{PREFIX}B{i}", now, now, "Administrator", "Administrator", f"{PREFIX}P{i % 3}", "Administrator",
+              today + timedelta(days=i), "Active", 0) for i in range(6)],
+        )
+
+    def test_indexes_usable(self):
+        if frappe.db.db_type != "mariadb":
+            self.skipTest("EXPLAIN checks are MariaDB only")
+        # test sites are tiny, so only index usability is asserted, not the absence of full scans
+        _report, failures = query_plans.check(min_rows=10**9)
+        self.assertEqual(failures, [])
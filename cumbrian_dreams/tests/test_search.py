@@ -0,0 +1,51 @@
+# apps/cumbrian_dreams/cumbrian_dreams/tests/test_search.py
+from datetime import date
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from cumbrian_dreams.search import MAX_STAY_NIGHTS, fulltext_supported, stay_range, text_match
+
+
+class TestStayRange(FrappeTestCase):
+    def test_dates(self):
+        self.assertIsNone(stay_range(None, "2026-03-05"))
+        self.assertEqual(stay_range("2026-03-01"), (date(2026, 3, 1), date(2026, 3, 2)))
+        self.assertEqual(stay_range("2026-03-01", "2026-03-05"), (date(2026, 3, 1), date(2026, 3, 5)))
+
+    def test_rejected(self):
+        for from_date, to_date in (
+            ("2026-03-05", "2026-03-05"),
+            ("2026-03-05", "2026-03-01"),
+            ("2026-03-01", "2026-06-30"),
+            ("2026-13-45", None),
+        ):
+            with self.assertRaises(frappe.ValidationError):
+                stay_range(from_date, to_date)
+
+    def test_longest_stay(self):
+        check_in, check_out = stay_range("2026-01-01", "2026-03-02")
+        self.assertEqual((check_out - check_in).days, MAX_STAY_NIGHTS)
+
+
+class TestTextMatch(FrappeTestCase):
+    def setUp(self):
+        self.prop = frappe.qb.DocType("Property")
+
+    def test_stopwords_and_short_words(self):
+        if not fulltext_supported():
+            self.skipTest("FULLTEXT is MariaDB only")
+        criterion, score = text_match(self.prop, "Cottage with a hot tub by the sea")
+        self.assertIn("'+Cottage* +hot* +tub* +sea*'", str(score))
+        sql = str(criterion)
+        self.assertNotIn("with", sql)
+        self.assertNotIn("%by%", sql)  # stopword, not a LIKE either
+
+        criterion, _ = text_match(self.prop, "spa ox")
+        self.assertIn("'+spa*'", str(criterion))
+        self.assertIn("'%ox%'", str(criterion))  # below innodb_ft_min_token_size
+
+    def test_like_only(self):
+        criterion, score = text_match(self.prop, " ox ")
+        self.assertIsNone(score)
+        self.assertIn("'%ox%'", str(criterion))
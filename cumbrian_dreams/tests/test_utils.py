@@ -0,0 +1,31 @@
+# apps/cumbrian_dreams/cumbrian_dreams/tests/test_utils.py
+from datetime import date
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from cumbrian_dreams.utils import decode_cursor, encode_cursor, page_cursor, read_page_cursor
+
+
+class TestCursors(FrappeTestCase):
+    def test_round_trip(self):
+        payload = {"k": "booking_date", "d": "desc", "v": "2026-03-01", "n": "BOOK-00000001"}
+        token = encode_cursor(payload)
+        self.assertNotIn("=", token)
+        self.assertEqual(decode_cursor(token), payload)
+
+    def test_dates_are_stored_as_strings(self):
+        self.assertEqual(decode_cursor(encode_cursor({"v": date(2026, 3, 1)})), {"v": "2026-03-01"})
+
+    def test_malformed_token(self):
+        for token in ("not a cursor", encode_cursor([1, 2]), ""):
+            with self.assertRaises(frappe.ValidationError):
+                decode_cursor(token)
+
+    def test_page_cursor_bound_to_its_order(self):
+        token = page_cursor("booking_date", "desc", {"booking_date": "2026-03-01", "name": "BOOK-00000001"})
+        self.assertEqual(read_page_cursor(token, "booking_date", "desc")["n"], "BOOK-00000001")
+        with self.assertRaises(frappe.ValidationError):
+            read_page_cursor(token, "booking_date", "asc")
+        with self.assertRaises(frappe.ValidationError):
+            read_page_cursor(encode_cursor({"k": "name", "d": "asc"}), "name", "asc")
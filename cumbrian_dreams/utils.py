@@ -0,0 +1,158 @@
+# apps/cumbrian_dreams/cumbrian_dreams/utils.py
+import base64
+import json
+import time
+
+import frappe
+
+# how long a finished flight's result stays readable by callers that waited on it
+SINGLE_FLIGHT_RESULT_TTL = 15
+
+
+def _release(cache, lock_key: bytes, token: str):
+    # release only our own lock (it may have expired and been re-taken)
+    held = cache.get(lock_key)
+    if held is not None and held.decode() == token:
+        cache.delete(lock_key)
+
+
+def _await_flight(cache, key: str, held: bytes | None, deadline: float, poll: float):
+    """
+    ({"value": ...} published by the leader holding `key` with token `held`,
+    or None) once that lock is released or time runs out. The token is read
+    when the lock is found taken, so a result left by an earlier flight, or
+    published by a later one, is never taken for this one.
+    """
+    if held is None:
+        # the leader finished before we looked; its result can't be told from an older one
+        return None
+    lock_key = cache.make_key(f"sf:lock:{key}")
+    while time.monotonic() < deadline and cache.get(lock_key) == held:
+        time.sleep(poll)
+    published = cache.get_value(f"sf:result:{key}", expires=True)
+    if published is not None and published.get("token") == held.decode():
+        return published
+    return None
+
+
+def single_flight(key: str, compute, lock_ttl: int = 60, wait: float = 30.0, poll: float = 0.05):
+    """
+    Run compute() once for all concurrent callers sharing `key`, across workers.
+
+    The first caller takes a Redis lock (SET NX), computes and publishes the
+    result briefly, stamped with its lock token. Other callers poll until that
+    lock is released, then return the result carrying the same token. If the
+    leader failed or the wait runs out, a waiting caller computes the value
+    itself; `wait` should cover how long compute() may take.
+    """
+    cache = frappe.cache()
+    lock_key = cache.make_key(f"sf:lock:{key}")
+    token = frappe.generate_hash(length=12)
+
+    if cache.set(lock_key, token, nx=True, ex=lock_ttl):
+        try:
+            value = compute()
+            cache.set_value(
+                f"sf:result:{key}", {"value": value, "token": token}, expires_in_sec=SINGLE_FLIGHT_RESULT_TTL
+            )
+            return value
+        finally:
+            _release(cache, lock_key, token)
+
+    published = _await_flight(cache, key, cache.get(lock_key), time.monotonic() + wait, poll)
+    return published["value"] if published is not None else compute()
+
+
+def single_flight_many(keys, compute, lock_ttl: int = 60, wait: float = 30.0, poll: float = 0.05) -> dict:
+    """
+    single_flight() for several keys at once, sharing the same locks and
+    results. compute(keys) returns {key: value}. It is called once for all the
+    keys this caller leads, so their work can share one fan-out, and once more
+    for keys whose leader failed or did not finish in time.
+    """
+    cache = frappe.cache()
+    token = frappe.generate_hash(length=12)
+    led, waiting = [], {}
+    for key in dict.fromkeys(keys):
+        lock_key = cache.make_key(f"sf:lock:{key}")
+        if cache.set(lock_key, token, nx=True, ex=lock_ttl):
+            led.append(key)
+        else:
+            waiting[key] = cache.get(lock_key)
+
+    out = {}
+    if led:
+        try:
+            out = compute(led)
+            for key in led:
+                cache.set_value(
+                    f"sf:result:{key}", {"value": out[key], "token": token}, expires_in_sec=SINGLE_FLIGHT_RESULT_TTL
+                )
+        finally:
+            for key in led:
+                _release(cache, cache.make_key(f"sf:lock:{key}"), token)
+
+    deadline = time.monotonic() + wait
+    leftover = []
+    for key, held in waiting.items():
+        published = _await_flight(cache, key, held, deadline, poll)
+        if published is None:
+            leftover.append(key)
+        else:
+            out[key] = published["value"]
+    if leftover:
+        out.update(compute(leftover))
+    return out
+
+
+def encode_cursor(payload: dict) -> str:
+    """Opaque, URL-safe paging token for `payload` (dates are stored as strings)."""
+    raw = json.dumps(payload, separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> dict:
+    """Inverse of encode_cursor(); a malformed token is a ValidationError."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+    except Exception:
+        payload = None
+    if not isinstance(payload, dict):
+        frappe.throw("Invalid cursor", exc=frappe.ValidationError)
+    return payload
+
+
+def page_cursor(key: str, direction: str, last_row: dict) -> str:
+    """Keyset cursor positioned after `last_row` for an `order by key direction, name direction` listing."""
+    return encode_cursor({"k": key, "d": direction, "v": last_row.get(key), "n": last_row["name"]})
+
+
+def read_page_cursor(token: str, key: str, direction: str) -> dict:
+    """
+    Decode a page_cursor() token ({"v": ..., "n": ...}, or {"o": offset} for
+    orders that cannot be keyed) and check it belongs to the same ordering.
+    """
+    payload = decode_cursor(token)
+    if payload.get("k") != key or payload.get("d") != direction:
+        frappe.throw("Cursor does not match order_by", exc=frappe.ValidationError)
+    if "o" not in payload and "n" not in payload:
+        frappe.throw("Invalid cursor", exc=frappe.ValidationError)
+    return payload
+
+
+def reserve_series(prefix: str, count: int, digits: int) -> list[str]:
+    """
+    Claim `count` consecutive names of a naming series ("BOOK-" + 8 digits)
+    in one statement pair, like frappe.model.naming.getseries does for one.
+    The Series row stays locked until the transaction ends.
+    """
+    series = frappe.qb.DocType("Series")
+    row = frappe.qb.from_(series).where(series.name == prefix).for_update().select(series.current).run()
+    if row:
+        current = int(row[0][0] or 0)
+        frappe.qb.update(series).set(series.current, current + count).where(series.name == prefix).run()
+    else:
+        current = 0
+        frappe.qb.into(series).columns("name", "current").insert(prefix, count).run()
+    return [f"{prefix}{str(current + i).zfill(digits)}" for i in range(1, count + 1)]